@@ -3,6 +3,7 @@ import { useMutation } from "@tanstack/react-query";
 import { Button } from "@/components/ui/button";
 import { useToast } from "@/hooks/use-toast";
 import { apiRequest } from "@/lib/queryClient";
+import type { PresignedUploadResponse } from "@shared/api-types";
 
 interface FileUploadProps {
   onUploadComplete: (sessionId: string) => void;
@@ -22,50 +23,50 @@ export default function FileUpload({ onUploadComplete }: FileUploadProps) {
 
   const uploadMutation = useMutation({
     mutationFn: async (files: File[]) => {
-      console.log("=== MUTATION STARTED ===");
       console.log(
         "Uploading files:",
         files.length,
         files.map((f) => f.name),
       );
-      const formData = new FormData();
-      files.forEach((file, index) => {
-        console.log(`Adding file ${index}:`, file.name, file.size, "bytes");
-        formData.append("files", file);
-      });
-      formData.append("uploadType", uploadType);
-
-      console.log(
-        "FormData entries:",
-        Array.from(formData.entries()).map(([key, value]) => [
-          key,
-          value instanceof File ? `File: ${value.name}` : value,
-        ]),
-      );
 
-      console.log("Making request to:", "/api/upload");
-      console.log("Request method:", "POST");
-      console.log(
-        "FormData size:",
-        formData.has("files") ? "Has files" : "No files",
+      // Reserve S3 keys and get a presigned PUT URL for every file
+      const presignedResponse = await apiRequest("POST", "/api/upload/presigned", {
+        uploadType,
+        files: files.map((file) => ({
+          name: file.name,
+          size: file.size,
+          type: file.type || undefined,
+        })),
+      });
+      const { sessionId, uploads }: PresignedUploadResponse =
+        await presignedResponse.json();
+
+      // Files go straight to S3 in parallel
+      await Promise.all(
+        uploads.map(async (upload, index) => {
+          const response = await fetch(upload.url, {
+            method: "PUT",
+            headers: upload.headers,
+            body: files[index],
+          });
+          if (!response.ok) {
+            throw new Error(
+              `Failed to upload ${upload.fileName}: ${response.status}`,
+            );
+          }
+        }),
       );
 
-      try {
-        const response = await apiRequest("POST", "/api/upload", formData);
-        console.log("Response status:", response.status);
-        console.log("Response ok:", response.ok);
-        const result = await response.json();
-        console.log("Response data:", result);
-        return result;
-      } catch (error) {
-        console.error("Network/Parse error:", error);
-        console.error(
-          "Error details:",
-          (error as Error).message,
-          (error as Error).stack,
-        );
-        throw error;
+      // Once every file has landed the server is notified one file at a time,
+      // so the last notification alone sees the session fully uploaded
+      for (const upload of uploads) {
+        await apiRequest("POST", "/api/webhook/process", {
+          sessionId,
+          s3Key: upload.s3Key,
+        });
       }
+
+      return { sessionId };
     },
     onSuccess: (data) => {
       toast({
@@ -280,54 +281,9 @@ export default function FileUpload({ onUploadComplete }: FileUploadProps) {
       return;
     }
 
-    // Simple direct test first
-    console.log("=== TESTING DIRECT UPLOAD ===");
-    try {
-      const testFile = uploadedFiles[0].file;
-      console.log("Test file:", testFile.name, testFile.size);
-
-      const formData = new FormData();
-      formData.append("files", testFile);
-      formData.append("uploadType", uploadType);
-
-      console.log("Making direct fetch request...");
-      const response = await fetch("/api/upload", {
-        method: "POST",
-        body: formData,
-      });
-
-      console.log("Direct response status:", response.status);
-      console.log("Direct response ok:", response.ok);
-
-      if (response.ok) {
-        const result = await response.json();
-        console.log("Direct upload SUCCESS:", result);
-        toast({
-          title: "Upload successful",
-          description: "File uploaded successfully",
-        });
-        onUploadComplete(result.sessionId);
-      } else {
-        const errorText = await response.text();
-        console.error("Direct upload FAILED:", response.status, errorText);
-        toast({
-          title: "Upload failed",
-          description: `Error: ${response.status} ${errorText}`,
-          variant: "destructive",
-        });
-      }
-    } catch (error) {
-      console.error("Direct upload ERROR:", error);
-      toast({
-        title: "Upload failed",
-        description: `Network error: ${(error as Error).message}`,
-        variant: "destructive",
-      });
-    }
+    uploadMutation.mutate(uploadedFiles.map((f) => f.file));
   };
 
-
-
   const getFileIcon = (fileName: string) => {
     const ext = fileName.toLowerCase().split(".").pop();
     const iconMap: Record<string, string> = {
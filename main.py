@@ -2,31 +2,60 @@
 
 import os
 import time
-import json
-import traceback
+import logging
 import asyncio
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Tuple
 from pathlib import Path
-import uuid
-from datetime import datetime
+import hashlib
+from itertools import chain
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
 # Import our Python services
-from server.python_storage import storage, FileAnalysisCreate, AnalysisSessionCreate
+from server.python_storage import storage, FileAnalysisCreate, AnalysisSessionCreate, RedisStorage
 from server.python_services.file_processor import file_processor
 from server.python_services.aws_service import aws_service
+from server.python_services.cache_service import cache_service
+from server.python_services.task_queue import task_queue
+from server.python_services.log_config import configure_logging
 
-app = FastAPI()
+# Request handlers only enqueue log records, a listener thread does the blocking stdout writes
+log_listener = configure_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    await task_queue.connect()
+    yield
+    # Release pooled Redis and S3 connections on shutdown
+    await task_queue.close()
+    await cache_service.close()
+    await aws_service.close()
+    log_listener.stop()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Maximum number of files streamed to S3 concurrently per upload request
+UPLOAD_CONCURRENCY = 8
+
+# Completed results are cacheable, but must be revalidated since a session
+# can be reanalyzed under the same URL
+RESULTS_CACHE_CONTROL = "public, no-cache"
+
+# Code file extensions accepted for analysis
+VALID_EXTENSIONS = frozenset({'.js', '.jsx', '.ts', '.tsx', '.py', '.java', '.cpp', '.c', '.go'})
 
 # Add CORS middleware
 app.add_middleware(
@@ -40,21 +69,15 @@ app.add_middleware(
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    path = str(request.url.path)
+    start_time = time.perf_counter()
+    path = request.url.path
     
     response = await call_next(request)
     
-    process_time = time.time() - start_time
-    
-    if path.startswith("/api"):
-        # Try to capture JSON response for logging (similar to Express version)
-        log_line = f"{request.method} {path} {response.status_code} in {process_time*1000:.0f}ms"
-        
-        if len(log_line) > 80:
-            log_line = log_line[:79] + "…"
-        
-        print(log_line)
+    if path.startswith("/api") and logger.isEnabledFor(logging.INFO):
+        # Formatting is deferred to the logging listener thread
+        process_ms = (time.perf_counter() - start_time) * 1000
+        logger.info("%s %s %d in %.0fms", request.method, path, response.status_code, process_ms)
     
     return response
 
@@ -64,14 +87,110 @@ async def global_exception_handler(request: Request, exc: Exception):
     status_code = getattr(exc, 'status_code', 500)
     message = str(exc) if str(exc) else "Internal Server Error"
     
-    print(f"Error: {message}")
-    traceback.print_exc()
+    logger.error("Error: %s", message, exc_info=exc)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content={"message": message}
     )
 
+class WebhookPayload(BaseModel):
+    sessionId: str
+    s3Key: str
+
+class PresignedUploadFile(BaseModel):
+    name: str
+    size: int
+    type: Optional[str] = None
+
+class PresignedUploadRequest(BaseModel):
+    files: List[PresignedUploadFile]
+    uploadType: str
+
+def validate_file_types(file_names: List[Optional[str]]) -> None:
+    """Reject the upload if any file is not a supported code file"""
+    invalid_files = []
+    
+    for file_name in file_names:
+        if file_name and os.path.splitext(file_name)[1].lower() not in VALID_EXTENSIONS:
+            invalid_files.append(file_name)
+
+    if invalid_files:
+        logger.info("Invalid files found: %s", invalid_files)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Invalid file types found: {', '.join(invalid_files)}. Only code files (.js, .jsx, .ts, .tsx, .py, .java, .cpp, .c, .go) are allowed."
+        )
+
+async def schedule_processing(background_tasks: BackgroundTasks, session_id: str) -> None:
+    """Hand the session to the arq workers, or process it in this worker when no queue is configured"""
+    if task_queue.enabled:
+        await task_queue.enqueue_session(session_id)
+    else:
+        background_tasks.add_task(file_processor.process_session, session_id)
+
+# Direct-to-S3 upload endpoint: the browser PUTs each file to a presigned URL
+@app.post("/api/upload/presigned")
+async def create_presigned_upload(upload: PresignedUploadRequest):
+    try:
+        if not upload.files:
+            raise HTTPException(status_code=400, detail="No files uploaded")
+
+        logger.info("Presigned upload request - Type: %s, Files: %s", upload.uploadType,
+                    [{"name": f.name, "size": f.size, "type": f.type} for f in upload.files])
+
+        validate_file_types([f.name for f in upload.files])
+
+        # One timestamp for the session and all of its file records
+        now = datetime.now(timezone.utc)
+
+        # The session stays pending until the webhook has seen every file land in S3
+        session = await storage.create_analysis_session(AnalysisSessionCreate(
+            status='pending',
+            totalFiles=len(upload.files),
+            processedFiles=0,
+            createdAt=now
+        ))
+
+        async def presign_file(file: PresignedUploadFile) -> Dict[str, Any]:
+            content_type = file.type or 'application/octet-stream'
+            presigned = await aws_service.generate_presigned_upload(file.name, session.id, content_type)
+            file_analysis = await storage.create_file_analysis(FileAnalysisCreate(
+                sessionId=session.id,
+                fileName=file.name,
+                fileSize=file.size,
+                fileType=content_type,
+                s3Key=presigned['key'],
+                status='uploading',
+                createdAt=now
+            ))
+            return {
+                "fileId": file_analysis.id,
+                "fileName": file.name,
+                "s3Key": presigned['key'],
+                "url": presigned['url'],
+                "headers": {"Content-Type": content_type}
+            }
+
+        uploads = await asyncio.gather(*(presign_file(file) for file in upload.files))
+
+        return {
+            "sessionId": session.id,
+            "uploads": uploads
+        }
+
+    except HTTPException:
+        raise
+    except Exception as error:
+        logger.exception("Presigned upload error: %s", error)
+        raise HTTPException(
+            status_code=500, 
+            detail={
+                "message": "Upload failed", 
+                "error": str(error)
+            }
+        )
+
 # File upload endpoint
 @app.post("/api/upload")
 async def upload_files(
@@ -83,54 +202,56 @@ async def upload_files(
         if not files or len(files) == 0:
             raise HTTPException(status_code=400, detail="No files uploaded")
 
-        print(f"Upload request - Type: {uploadType}, Files received:", 
-              [{"name": f.filename, "size": f.size, "type": f.content_type} for f in files])
+        logger.info("Upload request - Type: %s, Files received: %s", uploadType,
+                    [{"name": f.filename, "size": f.size, "type": f.content_type} for f in files])
 
         # Validate file types
-        valid_extensions = ['.js', '.jsx', '.ts', '.tsx', '.py', '.java', '.cpp', '.c', '.go']
-        invalid_files = []
-        
-        for file in files:
-            if file.filename and not any(file.filename.lower().endswith(ext) for ext in valid_extensions):
-                invalid_files.append(file.filename)
-
-        if invalid_files:
-            print('Invalid files found:', invalid_files)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid file types found: {', '.join(invalid_files)}. Only code files (.js, .jsx, .ts, .tsx, .py, .java, .cpp, .c, .go) are allowed."
-            )
+        validate_file_types([f.filename for f in files])
+
+        # One timestamp for the session and all of its file records
+        now = datetime.now(timezone.utc)
 
         # Create analysis session
         session = await storage.create_analysis_session(AnalysisSessionCreate(
             status='pending',
             totalFiles=len(files),
-            processedFiles=0
+            processedFiles=0,
+            createdAt=now
         ))
 
-        # Create file analysis records and upload to S3
-        for file in files:
-            # Read file content
-            content = await file.read()
-            await file.seek(0)  # Reset file pointer for potential future reads
-            
-            if file.filename:
-                # Upload file to S3
-                s3_key = await aws_service.upload_file_to_s3(content, file.filename, session.id)
-                await storage.create_file_analysis(FileAnalysisCreate(
+        # Create file analysis records and upload to S3, several files at a time
+        upload_semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+        async def ingest_file(file: UploadFile) -> str:
+            async with upload_semaphore:
+                # Size the upload without reading it into memory
+                file_size = file.size
+                if file_size is None:
+                    file.file.seek(0, os.SEEK_END)
+                    file_size = file.file.tell()
+                    file.file.seek(0)
+                
+                # Stream the spooled upload straight to S3
+                s3_key = await aws_service.upload_file_to_s3(file.file, file.filename, session.id)
+                file_analysis = await storage.create_file_analysis(FileAnalysisCreate(
                     sessionId=session.id,
                     fileName=file.filename,
-                    fileSize=len(content),
+                    fileSize=file_size,
                     fileType=file.content_type or 'application/octet-stream',
                     s3Key=s3_key,
-                    status='uploaded'
+                    status='uploaded',
+                    createdAt=now
                 ))
+                return file_analysis.id
+
+        file_ids = await asyncio.gather(*(ingest_file(file) for file in files if file.filename))
+        logger.info("Uploaded %d files for session %s", len(file_ids), session.id)
 
         # Update session status
         await storage.update_analysis_session(session.id, {'status': 'processing'})
 
         # Trigger processing asynchronously
-        background_tasks.add_task(file_processor.process_session, session.id)
+        await schedule_processing(background_tasks, session.id)
 
         return {
             "sessionId": session.id,
@@ -140,8 +261,7 @@ async def upload_files(
     except HTTPException:
         raise
     except Exception as error:
-        print("Upload error:", error)
-        traceback.print_exc()
+        logger.exception("Upload error: %s", error)
         raise HTTPException(
             status_code=500, 
             detail={
@@ -154,37 +274,41 @@ async def upload_files(
 @app.get("/api/analysis/status/{session_id}")
 async def get_analysis_status(session_id: str):
     try:
+        cached = await cache_service.get_status(session_id)
+        if cached is not None:
+            return cached
+
         session = await storage.get_analysis_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        files = await storage.get_file_analysis_by_session(session_id)
-        
-        # Calculate processing steps
-        upload_completed = all(f.status != 'uploading' for f in files)
-        lambda_completed = all(f.status in ['processing', 'completed'] for f in files)
-        ecs_completed = all(f.status in ['analyzing', 'completed'] for f in files)
+        # Calculate processing steps from the session's rolling file counters
+        counts = session.fileStatusCounts
+        file_count = sum(counts.values())
+        completed_count = counts.get('completed', 0)
+        upload_completed = counts.get('uploading', 0) == 0
+        lambda_completed = counts.get('processing', 0) + completed_count == file_count
+        ecs_completed = counts.get('analyzing', 0) + completed_count == file_count
         bedrock_completed = session.status == 'completed'
 
-        total_size = sum(file.fileSize for file in files)
-
-        return {
+        status = {
             "status": session.status,
             "totalFiles": session.totalFiles,
             "processedFiles": session.processedFiles,
-            "totalSize": total_size,
+            "totalSize": session.totalSize,
             "uploadCompleted": upload_completed,
             "lambdaCompleted": lambda_completed,
             "ecsCompleted": ecs_completed,
             "bedrockCompleted": bedrock_completed,
             "uploadTime": 1.2 if upload_completed else None
         }
+        await cache_service.set_status(session_id, status)
+        return status
 
     except HTTPException:
         raise
     except Exception as error:
-        print("Status check error:", error)
-        traceback.print_exc()
+        logger.exception("Status check error: %s", error)
         raise HTTPException(
             status_code=500, 
             detail={
@@ -195,7 +319,7 @@ async def get_analysis_status(session_id: str):
 
 # Get analysis results
 @app.get("/api/analysis/results/{session_id}")
-async def get_analysis_results(session_id: str):
+async def get_analysis_results(session_id: str, request: Request):
     try:
         session = await storage.get_analysis_session(session_id)
         if not session:
@@ -204,36 +328,36 @@ async def get_analysis_results(session_id: str):
         if session.status != 'completed':
             raise HTTPException(status_code=400, detail="Analysis not completed yet")
 
-        files = await storage.get_file_analysis_by_session(session_id)
-        
-        # Aggregate results from all files
-        passed_checks = 0
-        warnings = 0
-        errors = 0
-        all_issues = []
-
-        for file in files:
-            if file.analysisResult:
-                result = file.analysisResult
-                passed_checks += result.get('passedChecks', 0)
-                warnings += result.get('warnings', 0)
-                errors += result.get('errors', 0)
-                issues = result.get('issues')
-                if issues is not None:
-                    all_issues.extend(issues)
+        # Results only change when the session is reanalyzed, which rolls completedAt
+        etag = f'W/"{session_id}-{session.completedAt.isoformat() if session.completedAt else ""}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
 
-        return {
-            "passedChecks": passed_checks,
-            "warnings": warnings,
-            "errors": errors,
+        headers = {"ETag": etag, "Cache-Control": RESULTS_CACHE_CONTROL}
+
+        cached = await cache_service.get_results(session_id)
+        if cached is not None:
+            return ORJSONResponse(cached, headers=headers)
+
+        # Counters are aggregated on write, only the issue lists need collecting
+        file_results = await storage.get_analysis_results_by_session(session_id)
+        all_issues = list(chain.from_iterable(
+            result['issues'] for result in file_results if result.get('issues')
+        ))
+
+        results = {
+            "passedChecks": session.passedChecks,
+            "warnings": session.warnings,
+            "errors": session.errors,
             "issues": all_issues
         }
+        await cache_service.set_results(session_id, results)
+        return ORJSONResponse(results, headers=headers)
 
     except HTTPException:
         raise
     except Exception as error:
-        print("Results fetch error:", error)
-        traceback.print_exc()
+        logger.exception("Results fetch error: %s", error)
         raise HTTPException(
             status_code=500, 
             detail={
@@ -242,30 +366,75 @@ async def get_analysis_results(session_id: str):
             }
         )
 
+# Re-run analysis for a session whose files are already in S3
+@app.post("/api/analysis/reanalyze/{session_id}")
+async def reanalyze_session(session_id: str, background_tasks: BackgroundTasks):
+    try:
+        session = await storage.get_analysis_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        if session.status in ('pending', 'processing'):
+            raise HTTPException(status_code=400, detail="Analysis already in progress")
+
+        # Reset every file in one bulk write, then drop the cached payloads
+        await storage.reset_files_for_session(session_id)
+        await storage.update_analysis_session(session_id, {
+            'status': 'processing',
+            'processedFiles': 0,
+            'completedAt': None
+        })
+        await cache_service.invalidate_session(session_id)
+
+        await schedule_processing(background_tasks, session_id)
+
+        return {
+            "sessionId": session_id,
+            "message": "Reanalysis started"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as error:
+        logger.exception("Reanalyze error: %s", error)
+        raise HTTPException(
+            status_code=500, 
+            detail={
+                "message": "Failed to start reanalysis", 
+                "error": str(error)
+            }
+        )
+
 # Webhook for AWS Lambda to trigger processing
 @app.post("/api/webhook/process")
-async def webhook_process(request: Request):
+async def webhook_process(payload: WebhookPayload, background_tasks: BackgroundTasks):
     try:
-        body = await request.json()
-        session_id = body.get('sessionId')
-        s3_key = body.get('s3Key')
-        
-        if not session_id or not s3_key:
-            raise HTTPException(status_code=400, detail="Missing sessionId or s3Key")
-
         # This would be called by Lambda function after S3 upload
         # Update file status (webhook functionality for Lambda integration)
-        file = await storage.get_file_analysis_by_s3_key(s3_key)
-        if file:
-            await storage.update_file_analysis(file.id, {'status': 'processing'})
+        file = await storage.get_file_analysis_by_s3_key(payload.s3Key)
+        if file and file.sessionId != payload.sessionId:
+            raise HTTPException(status_code=400, detail="File does not belong to this session")
+
+        # Only a file still uploading is moved, so a repeated notification is a no-op
+        if file and file.status == 'uploading':
+            # The browser reports its own upload, confirm the object actually landed in S3
+            if await aws_service.get_s3_object_size(file.s3Key) != file.fileSize:
+                raise HTTPException(status_code=409, detail="File has not been uploaded")
+            moved = await storage.transition_file_analysis(file.id, 'uploading', {'status': 'processing'})
+
+            # Direct uploads start processing once the last file of the session has landed;
+            # the webhook that wins the pending -> processing transition is the one that schedules it
+            session = await storage.get_analysis_session(file.sessionId) if moved else None
+            if session and session.status == 'pending' and session.fileStatusCounts.get('uploading', 0) == 0:
+                if await storage.transition_analysis_session(session.id, 'pending', {'status': 'processing'}):
+                    await schedule_processing(background_tasks, session.id)
 
         return {"message": "Processing triggered"}
 
     except HTTPException:
         raise
     except Exception as error:
-        print("Webhook error:", error)
-        traceback.print_exc()
+        logger.exception("Webhook error: %s", error)
         raise HTTPException(
             status_code=500, 
             detail={
@@ -277,33 +446,73 @@ async def webhook_process(request: Request):
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
 # Mount static files directory
 app.mount("/assets", StaticFiles(directory="dist/public/assets"), name="assets")
 
+STATIC_DIR = Path("dist/public")
+
+INDEX_PATH = STATIC_DIR / "index.html"
+
+# Built files under dist/public, scanned once so requests never stat the disk.
+# In development the build may change underneath the server, so keep checking disk there.
+STATIC_FILES = frozenset(
+    p.relative_to(STATIC_DIR).as_posix() for p in STATIC_DIR.rglob("*") if p.is_file()
+)
+SCAN_STATIC_FILES = os.environ.get('NODE_ENV') != 'development'
+
+def load_index() -> Tuple[int, bytes, Dict[str, str]]:
+    """Read index.html, returns its mtime, content and the headers it is served with"""
+    mtime = INDEX_PATH.stat().st_mtime_ns
+    html = INDEX_PATH.read_bytes()
+    etag = f'"{hashlib.sha256(html).hexdigest()[:16]}"'
+    return mtime, html, {"ETag": etag, "Cache-Control": "no-cache"}
+
+# Keep the SPA shell in memory, it is served for every client-side route.
+# A rebuild renames the hashed assets it links to, so in development it is
+# re-read whenever the file changes.
+index_shell = load_index()
+
+async def index_response(request: Request) -> Response:
+    """Serve the cached index.html, or a 304 when the client already has it"""
+    global index_shell
+    if not SCAN_STATIC_FILES:
+        mtime = (await asyncio.to_thread(INDEX_PATH.stat)).st_mtime_ns
+        if mtime != index_shell[0]:
+            index_shell = await asyncio.to_thread(load_index)
+    
+    _, html, headers = index_shell
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=html, media_type="text/html", headers=headers)
+
 # Serve static files and handle client-side routing
 @app.get("/")
 @app.head("/")
-async def serve_index():
+async def serve_index(request: Request):
     """Serve the main React application"""
-    return FileResponse("dist/public/index.html")
+    return await index_response(request)
 
 @app.get("/{path:path}")
-async def serve_static_files(path: str):
+async def serve_static_files(path: str, request: Request):
     """Serve static assets and handle client-side routing"""
     # Skip API routes
     if path.startswith("api/"):
         raise HTTPException(status_code=404, detail="Not found")
     
-    static_path = Path(f"dist/public/{path}")
-    
     # If it's a static file that exists, serve it
-    if static_path.exists() and static_path.is_file():
-        return FileResponse(static_path)
+    if SCAN_STATIC_FILES:
+        if path in STATIC_FILES:
+            return FileResponse(STATIC_DIR / path)
+    elif "." in path.rsplit("/", 1)[-1]:
+        # Client-side routes have no file extension, skip the filesystem for them
+        static_path = STATIC_DIR / path
+        if await asyncio.to_thread(static_path.is_file):
+            return FileResponse(static_path)
     
     # Otherwise, serve the React app (for client-side routing)
-    return FileResponse("dist/public/index.html")
+    return await index_response(request)
 
 # For direct execution
 if __name__ == "__main__":
@@ -313,7 +522,7 @@ if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     is_dev = os.environ.get('NODE_ENV') == 'development'
     
-    # Run with uvicorn - use import string for reload mode
+    # Run with uvicorn - use import string for reload and multi-worker modes
     if is_dev:
         uvicorn.run(
             "main:app",
@@ -322,9 +531,16 @@ if __name__ == "__main__":
             reload=True
         )
     else:
+        # In-memory storage is per process, so only scale out by default when
+        # the workers share Redis storage; WEB_CONCURRENCY always wins
+        default_workers = max(2, os.cpu_count() or 2) if isinstance(storage, RedisStorage) else 1
+        workers = int(os.environ.get('WEB_CONCURRENCY', default_workers))
         uvicorn.run(
-            app,
+            "main:app",
             host="0.0.0.0",
             port=port,
-            reload=False
+            reload=False,
+            loop="uvloop",
+            http="httptools",
+            workers=workers
         )
\ No newline at end of file
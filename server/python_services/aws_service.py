@@ -2,23 +2,78 @@
 AWS service implementation that replicates the TypeScript AWS service
 """
 
+import io
 import os
 import json
+import logging
 import time
-from typing import List, Dict, Any, Optional
+import asyncio
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from typing import List, Dict, Any, Optional, BinaryIO, Tuple, Callable
+import aioboto3
+import orjson
 import boto3
+from aiobotocore.config import AioConfig
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
 BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'codereview-ai-files-108782072033')
 
+# Stream uploads in 8 MiB parts, up to 10 in flight, so large files are never held in
+# memory whole. Files under the threshold go out as a single put_object.
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10
+)
+
+# Reused to pull the JSON object out of Bedrock responses. A reply that is not
+# bare JSON or fenced is only searched from this many candidate roots.
+JSON_DECODER = json.JSONDecoder()
+MAX_JSON_ROOT_ATTEMPTS = 8
+
+# Fixed fields of the issue reported when an analysis cannot be parsed
+FALLBACK_ISSUE_FIELDS = {
+    "file": "system",
+    "code": None,
+    "suggestion": "Please try the analysis again"
+}
+
+# Objects larger than one part are downloaded as concurrent byte ranges
+S3_DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+S3_DOWNLOAD_CONCURRENCY = 8
+
+# Caps concurrent Bedrock calls from this process when files are analyzed one by one
+BEDROCK_CONCURRENCY = int(os.environ.get('BEDROCK_CONCURRENCY', '8'))
+bedrock_semaphore = asyncio.Semaphore(BEDROCK_CONCURRENCY)
+
+# Presigned download URLs are cached per key and reused until this many
+# seconds before they expire
+PRESIGNED_URL_CACHE_SIZE = 1024
+PRESIGNED_URL_REFRESH_MARGIN = 60
+
+# Size the connection pools for concurrent uploads and range downloads, back off
+# adaptively when throttled, and keep idle pooled connections alive
+AWS_CLIENT_OPTIONS = {
+    'max_pool_connections': 64,
+    'retries': {'max_attempts': 5, 'mode': 'adaptive'},
+    'tcp_keepalive': True
+}
+S3_CLIENT_CONFIG = AioConfig(**AWS_CLIENT_OPTIONS)
+BEDROCK_CLIENT_CONFIG = Config(**AWS_CLIENT_OPTIONS)
+
 # Configure AWS SDK
-s3_client = None
+aws_session = None
 bedrock_client = None
 
 if os.environ.get('AWS_ACCESS_KEY_ID'):
     try:
-        s3_client = boto3.client(
-            's3',
+        # The async S3 client is created lazily, it has to be entered inside the running event loop
+        aws_session = aioboto3.Session(
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
             region_name=os.environ.get('AWS_REGION', 'us-east-1')
@@ -28,59 +83,240 @@ if os.environ.get('AWS_ACCESS_KEY_ID'):
             'bedrock-runtime',
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.environ.get('AWS_REGION', 'us-east-1')
+            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+            config=BEDROCK_CLIENT_CONFIG
         )
     except Exception as e:
-        print(f"Warning: Failed to initialize AWS clients: {e}")
+        logger.warning("Failed to initialize AWS clients: %s", e)
+
+# Static parts of the code review prompt, the file listing goes between them
+ANALYSIS_PROMPT_HEADER = """
+You are an expert code reviewer. Analyze the following code files and provide a comprehensive review. Focus on:
+
+1. Code structure and architecture
+2. Missing error handling
+3. Unused imports or variables
+4. Performance optimizations
+5. Security vulnerabilities
+6. Best practices adherence
+
+Please respond with a JSON object in this exact format:
+{
+  "passedChecks": number,
+  "warnings": number,
+  "errors": number,
+  "issues": [
+    {
+      "type": "error|warning|success|suggestion",
+      "severity": "low|medium|high|critical",
+      "title": "Issue title",
+      "description": "Detailed description",
+      "file": "filename",
+      "line": number (optional),
+      "code": "problematic code snippet (optional)",
+      "suggestion": "suggested fix (optional)"
+    }
+  ]
+}
+
+Code Files:
+"""
+
+ANALYSIS_PROMPT_FOOTER = """
+Please provide a thorough analysis and return only the JSON response.
+        """
+
+def extract_json_object(text: str, is_root: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+    """
+    The JSON object a model reply holds: bare JSON, else the first ```json fence,
+    else the first of a few '{' positions that decodes to an object is_root accepts.
+    Returns None when there is none, nested objects are never mistaken for the root.
+    """
+    try:
+        value = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    else:
+        return value if isinstance(value, dict) and is_root(value) else None
+    
+    fence = text.find('```json')
+    if fence != -1:
+        start = text.find('{', fence)
+        try:
+            value = JSON_DECODER.raw_decode(text, start)[0] if start != -1 else None
+        except (json.JSONDecodeError, RecursionError):
+            value = None
+        return value if isinstance(value, dict) and is_root(value) else None
+    
+    start = text.find('{')
+    for _ in range(MAX_JSON_ROOT_ATTEMPTS):
+        if start == -1:
+            break
+        try:
+            value, end = JSON_DECODER.raw_decode(text, start)
+        except (json.JSONDecodeError, RecursionError):
+            start = text.find('{', start + 1)
+            continue
+        if isinstance(value, dict) and is_root(value):
+            return value
+        # Objects nested in this one cannot be the root either
+        start = text.find('{', end)
+    return None
+
+def is_analysis_root(value: Dict[str, Any]) -> bool:
+    return 'passedChecks' in value or 'issues' in value
 
 class AwsService:
     """AWS service class that replicates the TypeScript AwsService functionality"""
     
-    async def upload_file_to_s3(self, file_content: bytes, filename: str, session_id: str) -> str:
-        """Upload file to S3 and return the key"""
-        key = f"sessions/{session_id}/{int(time.time() * 1000)}-{filename}"
-        
-        if not s3_client:
+    def __init__(self):
+        self._s3 = None
+        self._s3_stack: Optional[AsyncExitStack] = None
+        self._s3_lock = asyncio.Lock()
+        # (key, expires_in) -> (url, reuse deadline), kept in least recently used order
+        self._presigned_urls: OrderedDict[Tuple[str, int], Tuple[str, float]] = OrderedDict()
+    
+    async def _get_s3(self):
+        """Return the shared async S3 client, opening it on first use"""
+        if not aws_session:
             raise Exception('S3 client not configured. Please check AWS credentials.')
         
+        if self._s3 is None:
+            async with self._s3_lock:
+                if self._s3 is None:
+                    stack = AsyncExitStack()
+                    self._s3 = await stack.enter_async_context(
+                        aws_session.client('s3', config=S3_CLIENT_CONFIG)
+                    )
+                    self._s3_stack = stack
+        return self._s3
+    
+    async def close(self) -> None:
+        """Close the shared S3 client and its connection pool"""
+        if self._s3_stack:
+            await self._s3_stack.aclose()
+            self._s3 = None
+            self._s3_stack = None
+    
+    def _build_s3_key(self, filename: str, session_id: str, now: Optional[float] = None) -> str:
+        return f"sessions/{session_id}/{int((now or time.time()) * 1000)}-{filename}"
+    
+    def _format_utc_timestamp(self, now: float) -> str:
+        """Format an epoch timestamp as ISO 8601 UTC without going through strftime"""
+        t = time.gmtime(now)
+        return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}Z"
+    
+    async def upload_file_to_s3(self, file_obj: BinaryIO, filename: str, session_id: str) -> str:
+        """Stream a file object to S3 and return the key"""
+        # One clock read for both the key and the upload metadata
+        now = time.time()
+        key = self._build_s3_key(filename, session_id, now)
+        s3 = await self._get_s3()
+        
         try:
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=key,
-                Body=file_content,
-                ContentType='application/octet-stream',
-                Metadata={
-                    'sessionId': session_id,
-                    'originalName': filename,
-                    'uploadedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
-                }
+            await s3.upload_fileobj(
+                file_obj,
+                BUCKET_NAME,
+                key,
+                ExtraArgs={
+                    'ContentType': 'application/octet-stream',
+                    'Metadata': {
+                        'sessionId': session_id,
+                        'originalName': filename,
+                        'uploadedAt': self._format_utc_timestamp(now)
+                    }
+                },
+                Config=S3_TRANSFER_CONFIG
             )
             return key
         except ClientError as error:
-            print('S3 upload error:', error)
+            logger.error("S3 upload error: %s", error)
             raise Exception('Failed to upload file to S3')
     
+    async def generate_presigned_upload(self, filename: str, session_id: str, content_type: str, expires_in: int = 300) -> Dict[str, str]:
+        """Reserve a key for a file and generate a presigned PUT URL the browser uploads to directly"""
+        s3 = await self._get_s3()
+        key = self._build_s3_key(filename, session_id)
+        
+        try:
+            url = await s3.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': BUCKET_NAME, 'Key': key, 'ContentType': content_type},
+                ExpiresIn=expires_in
+            )
+            return {'key': key, 'url': url}
+        except ClientError as error:
+            logger.error("Presigned upload URL generation error: %s", error)
+            raise Exception('Failed to generate presigned upload URL')
+    
     async def get_file_from_s3(self, s3_key: str) -> str:
         """Download file content from S3"""
-        if not s3_client:
-            raise Exception('S3 client not configured. Please check AWS credentials.')
+        s3 = await self._get_s3()
         
         try:
-            response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
-            return response['Body'].read().decode('utf-8')
+            # The first range doubles as the size probe, so small files still take a single GET
+            response = await s3.get_object(
+                Bucket=BUCKET_NAME,
+                Key=s3_key,
+                Range=f'bytes=0-{S3_DOWNLOAD_PART_SIZE - 1}'
+            )
+            total_size = int(response['ContentRange'].rsplit('/', 1)[1])
+            async with response['Body'] as body:
+                first_part = await body.read()
+            
+            if len(first_part) >= total_size:
+                return first_part.decode('utf-8')
+            
+            # Fill the remaining ranges in place, pinned to the same object version
+            buffer = bytearray(total_size)
+            buffer[:len(first_part)] = first_part
+            semaphore = asyncio.Semaphore(S3_DOWNLOAD_CONCURRENCY)
+            
+            async def fetch_range(start: int) -> None:
+                end = min(start + S3_DOWNLOAD_PART_SIZE, total_size) - 1
+                async with semaphore:
+                    part = await s3.get_object(
+                        Bucket=BUCKET_NAME,
+                        Key=s3_key,
+                        Range=f'bytes={start}-{end}',
+                        IfMatch=response['ETag']
+                    )
+                    async with part['Body'] as body:
+                        buffer[start:end + 1] = await body.read()
+            
+            await asyncio.gather(*(
+                fetch_range(start)
+                for start in range(len(first_part), total_size, S3_DOWNLOAD_PART_SIZE)
+            ))
+            return buffer.decode('utf-8')
         except ClientError as error:
-            print('S3 download error:', error)
+            # Ranged GETs are rejected for empty objects
+            if error.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return ''
+            logger.error("S3 download error: %s", error)
             raise Exception('Failed to download file from S3')
     
+    async def get_s3_object_size(self, s3_key: str) -> Optional[int]:
+        """Size of an uploaded object, None if nothing has been stored under the key"""
+        s3 = await self._get_s3()
+        
+        try:
+            response = await s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)
+            return response['ContentLength']
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error("S3 head error: %s", error)
+            raise Exception('Failed to check file in S3')
+    
     async def delete_file_from_s3(self, s3_key: str) -> None:
         """Delete file from S3"""
-        if not s3_client:
-            raise Exception('S3 client not configured. Please check AWS credentials.')
+        s3 = await self._get_s3()
         
         try:
-            s3_client.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
+            await s3.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
         except ClientError as error:
-            print('S3 delete error:', error)
+            logger.error("S3 delete error: %s", error)
             raise Exception('Failed to delete file from S3')
     
     async def analyze_code_with_bedrock(self, file_contents: List[str], file_names: List[str]) -> Dict[str, Any]:
@@ -91,135 +327,126 @@ class AwsService:
         prompt = self._build_analysis_prompt(file_contents, file_names)
         
         try:
-            response = bedrock_client.invoke_model(
-                modelId='us.anthropic.claude-3-7-sonnet-20250219-v1:0',
-                contentType='application/json',
-                accept='*/*',
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 4000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                })
-            )
-            
-            # Fix for invalidbase64 error - properly decode the streaming body
-            response_body = response['body'].read().decode('utf-8')
-            response_json = json.loads(response_body)
-            analysis_text = response_json['content'][0]['text']
+            # boto3 blocks until the stream is fully read, keep it off the event loop
+            analysis_text = await asyncio.to_thread(self._stream_bedrock_response, prompt)
             
             # Parse the analysis result from Claude's response
             return self._parse_analysis_result(analysis_text)
         except Exception as error:
-            print('Bedrock analysis error:', error)
+            logger.error("Bedrock analysis error: %s", error)
             raise Exception('Failed to analyze code with Bedrock')
     
+    async def analyze_single_file_with_bedrock(self, file_content: str, file_name: str) -> Dict[str, Any]:
+        """Analyze one file with its own prompt, so the files of a session can be analyzed concurrently"""
+        async with bedrock_semaphore:
+            result = await self.analyze_code_with_bedrock([file_content], [file_name])
+        
+        # Every issue of a single-file analysis belongs to that file
+        issues = result.get('issues') if isinstance(result, dict) else None
+        if isinstance(issues, list):
+            for issue in issues:
+                if isinstance(issue, dict):
+                    issue['file'] = file_name
+        return result
+    
+    def _stream_bedrock_response(self, prompt: str) -> str:
+        """Stream Claude's response from Bedrock and return the generated text"""
+        response = bedrock_client.invoke_model_with_response_stream(
+            modelId='us.anthropic.claude-3-7-sonnet-20250219-v1:0',
+            contentType='application/json',
+            accept='*/*',
+            body=orjson.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 4000,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+        )
+        
+        # Text deltas are collected as they arrive instead of waiting for one complete body
+        text = io.StringIO()
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            
+            message = orjson.loads(chunk['bytes'])
+            if message['type'] == 'content_block_delta':
+                text.write(message['delta'].get('text', ''))
+        
+        return text.getvalue()
     
     def _build_analysis_prompt(self, file_contents: List[str], file_names: List[str]) -> str:
         """Build the prompt for code analysis"""
-        files = '\n'.join([
-            f"--- File: {file_names[i]} ---\n{file_contents[i]}\n"
-            for i in range(len(file_contents))
-        ])
-        
-        return f"""
-You are an expert code reviewer. Analyze the following code files and provide a comprehensive review. Focus on:
-
-1. Code structure and architecture
-2. Missing error handling
-3. Unused imports or variables
-4. Performance optimizations
-5. Security vulnerabilities
-6. Best practices adherence
-
-Please respond with a JSON object in this exact format:
-{{
-  "passedChecks": number,
-  "warnings": number,
-  "errors": number,
-  "issues": [
-    {{
-      "type": "error|warning|success|suggestion",
-      "severity": "low|medium|high|critical",
-      "title": "Issue title",
-      "description": "Detailed description",
-      "file": "filename",
-      "line": number (optional),
-      "code": "problematic code snippet (optional)",
-      "suggestion": "suggested fix (optional)"
-    }}
-  ]
-}}
-
-Code Files:
-{files}
-
-Please provide a thorough analysis and return only the JSON response.
-        """
+        # Join every piece once instead of building the file listing and then copying it into the template
+        parts = [ANALYSIS_PROMPT_HEADER]
+        for name, content in zip(file_names, file_contents):
+            parts.extend(("--- File: ", name, " ---\n", content, "\n\n"))
+        parts.append(ANALYSIS_PROMPT_FOOTER)
+        return ''.join(parts)
     
     def _parse_analysis_result(self, claude_response: str) -> Dict[str, Any]:
         """Parse analysis result from Claude's response"""
         try:
-            # Extract JSON from Claude's response
-            import re
-            json_match = re.search(r'\{.*\}', claude_response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
+            # Claude usually answers with bare JSON, otherwise it is embedded in a code fence or surrounding text
+            analysis = extract_json_object(claude_response, is_analysis_root)
+            if analysis is not None:
+                return analysis
             
             # Fallback if JSON parsing fails
-            return {
-                "passedChecks": 0,
-                "warnings": 1,
-                "errors": 1,
-                "issues": [
-                    {
-                        "type": "error",
-                        "severity": "medium",
-                        "title": "Analysis Parsing Error",
-                        "description": "Failed to parse the analysis result from AI service",
-                        "file": "system",
-                        "code": None,
-                        "suggestion": "Please try the analysis again"
-                    }
-                ]
-            }
+            return self._fallback_result("Analysis Parsing Error", "Failed to parse the analysis result from AI service")
         except Exception as error:
-            print('Failed to parse analysis result:', error)
-            return {
-                "passedChecks": 0,
-                "warnings": 1,
-                "errors": 1,
-                "issues": [
-                    {
-                        "type": "error",
-                        "severity": "medium",
-                        "title": "Analysis Error",
-                        "description": "The AI analysis service encountered an error",
-                        "file": "system",
-                        "code": None,
-                        "suggestion": "Please try the analysis again"
-                    }
-                ]
-            }
+            logger.error("Failed to parse analysis result: %s", error)
+            return self._fallback_result("Analysis Error", "The AI analysis service encountered an error")
+    
+    def _fallback_result(self, title: str, description: str) -> Dict[str, Any]:
+        """Single-issue result reported when Claude's response holds no usable analysis"""
+        return {
+            "passedChecks": 0,
+            "warnings": 1,
+            "errors": 1,
+            "issues": [
+                {
+                    "type": "error",
+                    "severity": "medium",
+                    "title": title,
+                    "description": description,
+                    **FALLBACK_ISSUE_FIELDS
+                }
+            ]
+        }
     
     async def generate_presigned_url(self, key: str, expires_in: int = 3600) -> str:
         """Generate presigned URL for file access"""
-        if not s3_client:
-            raise Exception('S3 client not configured. Please check AWS credentials.')
+        cache_key = (key, expires_in)
+        cached = self._presigned_urls.get(cache_key)
+        if cached and cached[1] > time.monotonic():
+            self._presigned_urls.move_to_end(cache_key)
+            return cached[0]
+        
+        s3 = await self._get_s3()
         
         try:
-            return s3_client.generate_presigned_url(
+            url = await s3.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': BUCKET_NAME, 'Key': key},
                 ExpiresIn=expires_in
             )
         except ClientError as error:
-            print('Presigned URL generation error:', error)
+            logger.error("Presigned URL generation error: %s", error)
             raise Exception('Failed to generate presigned URL')
+        
+        # Reuse the signed URL until shortly before it expires
+        if expires_in > PRESIGNED_URL_REFRESH_MARGIN:
+            self._presigned_urls[cache_key] = (url, time.monotonic() + expires_in - PRESIGNED_URL_REFRESH_MARGIN)
+            self._presigned_urls.move_to_end(cache_key)
+            if len(self._presigned_urls) > PRESIGNED_URL_CACHE_SIZE:
+                self._presigned_urls.popitem(last=False)
+        return url
 
 # Create the aws service instance
 aws_service = AwsService()
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Redis-backed cache for the analysis status and results endpoints
+"""
+
+import os
+import logging
+from typing import Any, Dict, Optional
+import msgpack
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+# Status payloads change while a session is processing, so they are only
+# cached long enough to absorb client polling. Results of a completed
+# session are immutable until the session is analyzed again.
+STATUS_TTL_SECONDS = 3
+RESULTS_TTL_SECONDS = 300
+
+# Configure the Redis connection pool (connections are opened lazily)
+redis_pool = None
+redis_client = None
+
+if REDIS_URL:
+    try:
+        redis_pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=50)
+        redis_client = redis.Redis(connection_pool=redis_pool)
+    except Exception as e:
+        logger.warning("Failed to initialize Redis client: %s", e)
+
+class CacheService:
+    """Cache service for per-session API payloads. Every method is a no-op when Redis is not configured."""
+
+    async def get_status(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get(f"status:{session_id}")
+
+    async def set_status(self, session_id: str, status: Dict[str, Any]) -> None:
+        await self._set(f"status:{session_id}", status, STATUS_TTL_SECONDS)
+
+    async def get_results(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._get(f"results:{session_id}")
+
+    async def set_results(self, session_id: str, results: Dict[str, Any]) -> None:
+        await self._set(f"results:{session_id}", results, RESULTS_TTL_SECONDS)
+
+    async def invalidate_session(self, session_id: str) -> None:
+        """Drop cached payloads for a session that is being (re)processed"""
+        if not redis_client:
+            return
+
+        try:
+            await redis_client.delete(f"status:{session_id}", f"results:{session_id}")
+        except Exception as error:
+            logger.error("Cache invalidation error: %s", error)
+
+    async def close(self) -> None:
+        if redis_client:
+            await redis_client.aclose()
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not redis_client:
+            return None
+
+        try:
+            cached = await redis_client.get(key)
+        except Exception as error:
+            # A cache outage must never fail the request, fall back to storage
+            logger.error("Cache read error: %s", error)
+            return None
+
+        return msgpack.unpackb(cached, raw=False) if cached is not None else None
+
+    async def _set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        if not redis_client:
+            return
+
+        try:
+            await redis_client.set(key, msgpack.packb(value, use_bin_type=True), ex=ttl)
+        except Exception as error:
+            logger.error("Cache write error: %s", error)
+
+# Create the cache service instance
+cache_service = CacheService()
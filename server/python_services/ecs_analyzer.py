@@ -5,19 +5,71 @@ This is based on the main.py from section 9.4 of the setup guide
 Used specifically for ECS container processing tasks
 """
 
+import io
 import os
-import json
+import asyncio
+import aioboto3
+import orjson
 import boto3
 import logging
+from typing import Any, Dict, List, Optional, Tuple
+from aiobotocore.config import AioConfig
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from fastapi import FastAPI, HTTPException
+from .aws_service import extract_json_object
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Downloads and Bedrock calls are limited separately, the Bedrock limit keeps
+# the service under the model's request rate
+MAX_CONCURRENT_DOWNLOADS = 16
+MAX_CONCURRENT_BEDROCK_CALLS = 8
+
+# Files are reviewed together in one prompt until a batch reaches either limit,
+# prompt size is estimated at about four characters per token. A batch never
+# holds more files than the output token cap leaves each its own budget for
+MAX_OUTPUT_TOKENS = 16_000
+MAX_TOKENS_PER_FILE = 4000
+MAX_BATCH_FILES = MAX_OUTPUT_TOKENS // MAX_TOKENS_PER_FILE
+MAX_BATCH_PROMPT_TOKENS = 100_000
+CHARS_PER_TOKEN = 4
+
+BATCH_RESPONSE_FORMAT = """
+    Provide analysis in JSON format, as one object keyed by each filename exactly as given above:
+    {
+        "<filename>": {
+            "overall_score": 85,
+            "summary": "Brief summary",
+            "issues": [
+                {"type": "error", "line": 15, "message": "Issue description", "suggestion": "How to fix"}
+            ],
+            "recommendations": ["List of recommendations"],
+            "security_concerns": ["Security issues if any"],
+            "performance_notes": ["Performance improvements"]
+        }
+    }
+    """
+
+# Large results documents are written as concurrent 8 MiB parts, smaller ones as a single PUT
+RESULTS_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8
+)
+
+# Pool enough connections for the concurrent file fan-out, back off adaptively when throttled
+AWS_CLIENT_OPTIONS = {
+    'max_pool_connections': 64,
+    'retries': {'max_attempts': 5, 'mode': 'adaptive'},
+    'tcp_keepalive': True
+}
+
 # Initialize AWS clients
-s3_client = boto3.client('s3', region_name='us-east-1')
-bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
+aws_session = aioboto3.Session(region_name='us-east-1')
+bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1', config=Config(**AWS_CLIENT_OPTIONS))
 
 app = FastAPI()
 
@@ -30,108 +82,178 @@ async def analyze_session(session_id: str, bucket: str):
     try:
         logger.info(f"Starting analysis for session: {session_id}")
         
-        # List all files in the session
-        prefix = f'sessions/{session_id}/'
-        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        
-        if 'Contents' not in response:
-            raise HTTPException(status_code=404, detail="No files found for session")
-        
-        analysis_results = []
-        
-        # Process each file
-        for obj in response['Contents']:
-            if obj['Key'].endswith('/'):  # Skip directories
-                continue
+        async with aws_session.client('s3', config=AioConfig(**AWS_CLIENT_OPTIONS)) as s3_client:
+            # List all files in the session
+            prefix = f'sessions/{session_id}/'
+            response = await s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
+            
+            if 'Contents' not in response:
+                raise HTTPException(status_code=404, detail="No files found for session")
+            
+            download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+            bedrock_semaphore = asyncio.Semaphore(MAX_CONCURRENT_BEDROCK_CALLS)
+            downloaded: asyncio.Queue = asyncio.Queue()
+            
+            async def download_file(key: str):
+                async with download_semaphore:
+                    logger.info(f"Processing file: {key}")
+                    
+                    # Download file content
+                    file_response = await s3_client.get_object(Bucket=bucket, Key=key)
+                    async with file_response['Body'] as body:
+                        content = (await body.read()).decode('utf-8')
                 
-            key = obj['Key']
-            logger.info(f"Processing file: {key}")
+                # Files are keyed by their full S3 key, basenames repeat across folders
+                await downloaded.put((key, content))
             
-            # Download file content
-            file_response = s3_client.get_object(Bucket=bucket, Key=key)
-            content = file_response['Body'].read().decode('utf-8')
+            async def analyze_batch(batch: List[Tuple[str, str]]):
+                async with bedrock_semaphore:
+                    return await analyze_with_bedrock_batch(
+                        [content for _, content in batch],
+                        [filename for filename, _ in batch]
+                    )
             
-            # Extract filename from key
-            filename = key.split('/')[-1]
+            async def dispatch_batches(pipeline: asyncio.TaskGroup, file_count: int) -> List[asyncio.Task]:
+                # Start each Bedrock call as soon as its batch fills, while later files are still downloading
+                batcher = FileBatcher()
+                tasks = []
+                for _ in range(file_count):
+                    batch = batcher.add(*await downloaded.get())
+                    if batch:
+                        tasks.append(pipeline.create_task(analyze_batch(batch)))
+                
+                batch = batcher.flush()
+                if batch:
+                    tasks.append(pipeline.create_task(analyze_batch(batch)))
+                return tasks
             
-            # Analyze with Bedrock
-            analysis = await analyze_with_bedrock(content, filename)
+            # Download files concurrently, skipping directories, and analyze them as they arrive
+            keys = [obj['Key'] for obj in response['Contents'] if not obj['Key'].endswith('/')]
+            async with asyncio.TaskGroup() as pipeline:
+                for key in keys:
+                    pipeline.create_task(download_file(key))
+                dispatcher = pipeline.create_task(dispatch_batches(pipeline, len(keys)))
             
-            analysis_results.append({
-                'file': key,
-                'analysis': analysis
-            })
-        
-        # Save combined results
-        result_key = f'results/{session_id}/analysis.json'
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=result_key,
-            Body=json.dumps({
+            analyses = {}
+            for batch_task in dispatcher.result():
+                analyses.update(batch_task.result())
+            
+            analysis_results = [
+                {
+                    'file': key,
+                    'analysis': analyses[key]
+                }
+                for key in keys
+            ]
+            
+            # Save combined results
+            result_key = f'results/{session_id}/analysis.json'
+            result_body = orjson.dumps({
                 'session_id': session_id,
                 'files_analyzed': len(analysis_results),
                 'results': analysis_results
-            }),
-            ContentType='application/json'
-        )
+            })
+            await s3_client.upload_fileobj(
+                io.BytesIO(result_body),
+                bucket,
+                result_key,
+                ExtraArgs={'ContentType': 'application/json'},
+                Config=RESULTS_TRANSFER_CONFIG
+            )
         
         return {"message": "Analysis completed", "session_id": session_id}
         
+    except ExceptionGroup as group:
+        # A failed download or Bedrock call cancels the pipeline, report that failure rather than the group
+        error = group.exceptions[0]
+        logger.error(f"Analysis error: {str(error)}", exc_info=error)
+        raise HTTPException(status_code=500, detail=str(error))
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def analyze_with_bedrock(code_content: str, filename: str):
+class FileBatcher:
     """
-    Analyze code using Claude 3.7 Sonnet
+    Groups (filename, content) pairs into batches that fit in a single prompt
     """
-    prompt = f"""
-    Analyze this code file and provide a comprehensive review:
-
-    Filename: {filename}
-    Code:
-    ```
-    {code_content}
-    ```
+    
+    def __init__(self):
+        self.batch: List[Tuple[str, str]] = []
+        self.batch_tokens = 0
+    
+    def add(self, filename: str, content: str) -> Optional[List[Tuple[str, str]]]:
+        """
+        Add a file, returns the previous batch if the file did not fit in it
+        """
+        tokens = len(content) // CHARS_PER_TOKEN
+        full = None
+        if self.batch and (len(self.batch) == MAX_BATCH_FILES or self.batch_tokens + tokens > MAX_BATCH_PROMPT_TOKENS):
+            full = self.flush()
+        
+        self.batch.append((filename, content))
+        self.batch_tokens += tokens
+        return full
+    
+    def flush(self) -> List[Tuple[str, str]]:
+        batch = self.batch
+        self.batch = []
+        self.batch_tokens = 0
+        return batch
 
-    Provide analysis in JSON format:
-    {{
-        "overall_score": 85,
-        "summary": "Brief summary",
-        "issues": [
-            {{"type": "error", "line": 15, "message": "Issue description", "suggestion": "How to fix"}}
-        ],
-        "recommendations": ["List of recommendations"],
-        "security_concerns": ["Security issues if any"],
-        "performance_notes": ["Performance improvements"]
-    }}
+async def analyze_with_bedrock_batch(code_contents: List[str], filenames: List[str]) -> Dict[str, Any]:
     """
+    Analyze several code files in one Claude 3.7 Sonnet call, returns the analysis for each filename
+    """
+    parts = ["""
+    Analyze these code files and provide a comprehensive review of each one:
+"""]
+    for filename, code_content in zip(filenames, code_contents):
+        parts.extend(("\n    Filename: ", filename, "\n    Code:\n    ```\n    ", code_content, "\n    ```\n"))
+    parts.append(BATCH_RESPONSE_FORMAT)
     
     body = {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 4000,
-        "messages": [{"role": "user", "content": prompt}]
+        "max_tokens": min(MAX_TOKENS_PER_FILE * len(filenames), MAX_OUTPUT_TOKENS),
+        "messages": [{"role": "user", "content": ''.join(parts)}]
     }
     
-    response = bedrock_client.invoke_model(
+    # boto3 blocks for the whole model call, run it in a thread so batches are analyzed concurrently
+    analysis_text = await asyncio.to_thread(invoke_bedrock, body)
+    
+    # A fenced or prefixed reply still holds the per-file object, the root is the one keyed by these files
+    analyses = extract_json_object(analysis_text, lambda value: any(name in value for name in filenames)) or {}
+    
+    fallback = {
+        "overall_score": 75,
+        "summary": "Analysis completed"
+    }
+    # The raw reply of a batch reviews every file in it, only attach it when it covers just this one
+    if len(filenames) == 1:
+        fallback["analysis_text"] = analysis_text
+    return {filename: analyses.get(filename, fallback) for filename in filenames}
+
+def invoke_bedrock(body: dict) -> str:
+    """
+    Stream Claude 3.7 Sonnet's response and return the generated text
+    """
+    response = bedrock_client.invoke_model_with_response_stream(
         modelId="us.anthropic.claude-3-7-sonnet-20250219-v1:0",
-        body=json.dumps(body),
+        body=orjson.dumps(body),
         contentType='application/json'
     )
     
-    # Fix for invalidbase64 error - properly decode the streaming body
-    response_body = response['body'].read().decode('utf-8')
-    response_json = json.loads(response_body)
-    analysis_text = response_json['content'][0]['text']
+    # Collect text deltas as they arrive instead of waiting for one complete body
+    text = io.StringIO()
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        
+        message = orjson.loads(chunk['bytes'])
+        if message['type'] == 'content_block_delta':
+            text.write(message['delta'].get('text', ''))
     
-    try:
-        return json.loads(analysis_text)
-    except:
-        return {
-            "overall_score": 75,
-            "summary": "Analysis completed",
-            "analysis_text": analysis_text
-        }
+    return text.getvalue()
 
 @app.get("/health")
 async def health_check():
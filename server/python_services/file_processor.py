@@ -2,10 +2,40 @@
 File processor implementation that replicates the TypeScript file processor
 """
 
+import os
 import asyncio
-from typing import List, Dict, Any
-from ..python_storage import storage
+import logging
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+from datetime import datetime, timezone
+from ..python_storage import storage, FileAnalysis
 from .aws_service import aws_service
+from .cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Caps concurrent S3 reads across all sessions processed by this process so
+# large sessions cannot exhaust sockets or the S3 client's connection pool
+S3_FETCH_CONCURRENCY = int(os.environ.get('S3_FETCH_CONCURRENCY', '16'))
+s3_fetch_semaphore = asyncio.Semaphore(S3_FETCH_CONCURRENCY)
+
+# ANALYSIS_MODE=per-file sends every file to Bedrock as its own prompt, the
+# default sends the whole session in one prompt and splits the result by file
+PER_FILE_ANALYSIS = os.environ.get('ANALYSIS_MODE') == 'per-file'
+
+# In-memory storage writes never wait on I/O, so per-file status writes call
+# its sync method directly instead of paying for a coroutine per file
+update_file_analysis_sync = getattr(storage, 'update_file_analysis_sync', None)
+
+# Result counters feed the session aggregates (Redis HINCRBY), so they must be integers
+RESULT_COUNTERS = ('passedChecks', 'warnings', 'errors')
+
+def to_count(value: Any) -> int:
+    """A result counter as an int, 0 when the model wrote something that is not a number"""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
 
 class FileProcessor:
     """File processor class that replicates the TypeScript FileProcessor functionality"""
@@ -13,7 +43,7 @@ class FileProcessor:
     async def process_session(self, session_id: str) -> None:
         """Process all files in a session"""
         try:
-            print(f"Starting processing for session: {session_id}")
+            logger.info("Starting processing for session: %s", session_id)
             
             # Get all files for the session
             files = await storage.get_file_analysis_by_session(session_id)
@@ -21,120 +51,143 @@ class FileProcessor:
             if not files:
                 raise Exception('No files found for session')
             
-            # Update session status
-            await storage.update_analysis_session(session_id, {'status': 'processing'})
-            
-            # Process each file
-            for file in files:
-                await self._process_file(file.id)
+            file_names = [f.fileName for f in files]
             
-            # Get actual file contents from uploads
-            file_contents = []
-            for file in files:
-                try:
-                    # Get file content from S3 or local storage
-                    content = await aws_service.get_file_from_s3(file.s3Key)
-                    file_contents.append(content)
-                except Exception as e:
-                    print(f"Error reading file {file.fileName}: {e}")
-                    file_contents.append("// Error: Could not read file content")
-            
-            # Use AWS Bedrock for real analysis
-            analysis_result = await aws_service.analyze_code_with_bedrock(
-                file_contents, 
-                [f.fileName for f in files]
+            # Update session status and drop any payloads cached from a previous run
+            await asyncio.gather(
+                storage.update_analysis_session(session_id, {'status': 'processing'}),
+                cache_service.invalidate_session(session_id)
             )
             
-            # Distribute analysis results across files
-            issues_per_file = self._distribute_issues_across_files(
-                analysis_result, 
-                [f.fileName for f in files]
+            # Fetch every file concurrently, each one moves to analyzing as soon as its
+            # own content has arrived instead of waiting for the slowest read
+            file_contents: List[str] = [''] * len(files)
+            status_writes: List[asyncio.Task] = []
+            for next_file in asyncio.as_completed([
+                self._process_file(index, file) for index, file in enumerate(files)
+            ]):
+                index, content = await next_file
+                file_contents[index] = content
+                if update_file_analysis_sync:
+                    update_file_analysis_sync(files[index].id, {'status': 'analyzing'})
+                else:
+                    # Don't hold up the next file on the write, it is awaited with the analysis
+                    status_writes.append(asyncio.create_task(
+                        storage.update_file_analysis(files[index].id, {'status': 'analyzing'})
+                    ))
+            
+            # Use AWS Bedrock for real analysis while the outstanding status writes land
+            issues_per_file, *_ = await asyncio.gather(
+                self._analyze_files(file_contents, file_names),
+                *status_writes
             )
             
             # Update each file with its portion of the analysis
-            for file in files:
-                file_result = issues_per_file.get(file.fileName, {
-                    'passedChecks': 0,
-                    'warnings': 0,
-                    'errors': 0,
-                    'issues': []
-                })
-                
-                await storage.update_file_analysis(file.id, {
+            empty_result = {
+                'passedChecks': 0,
+                'warnings': 0,
+                'errors': 0,
+                'issues': []
+            }
+            # One completion timestamp for every file and the session
+            now = datetime.now(timezone.utc)
+            await storage.bulk_update_file_analyses({
+                file.id: {
                     'status': 'completed',
-                    'analysisResult': file_result
-                })
+                    'analysisResult': issues_per_file.get(file.fileName, empty_result)
+                }
+                for file in files
+            }, now=now)
             
             # Update session as completed
             await storage.update_analysis_session(session_id, {
                 'status': 'completed',
                 'processedFiles': len(files)
-            })
+            }, now=now)
             
-            print(f"Session {session_id} processing completed successfully")
+            logger.info("Session %s processing completed successfully", session_id)
             
         except Exception as error:
-            print(f"Error processing session {session_id}:", error)
+            logger.error("Error processing session %s: %s", session_id, error)
             
             # Update session with error status
             await storage.update_analysis_session(session_id, {'status': 'error'})
             
             raise error
     
-    async def _process_file(self, file_id: str) -> None:
-        """Process a single file"""
-        # File processing will be handled in the main process_session method
-        # Individual file processing can be added here if needed
+    async def _analyze_files(self, file_contents: List[str], file_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Analyze the files with Bedrock, returns each file's portion of the analysis by file name"""
+        if PER_FILE_ANALYSIS:
+            # Single-file results need no distribution, the partitioning is intrinsic
+            results = await asyncio.gather(*(
+                aws_service.analyze_single_file_with_bedrock(content, name)
+                for content, name in zip(file_contents, file_names)
+            ))
+            return {name: self._normalize_result(result) for name, result in zip(file_names, results)}
         
-        # Update file status to processing
-        await storage.update_file_analysis(file_id, {'status': 'processing'})
+        analysis_result = await aws_service.analyze_code_with_bedrock(file_contents, file_names)
         
-        # TODO: Here you could add individual file processing steps
-        # For now, we'll process all files together in the main process_session method
+        # Distribute analysis results across files
+        return self._distribute_issues_across_files(self._normalize_result(analysis_result), file_names)
+    
+    def _normalize_result(self, result: Any) -> Dict[str, Any]:
+        """The model's result as a dict with integer counters and an issue list, anything else becomes the parsing fallback"""
+        if not isinstance(result, dict):
+            return aws_service._fallback_result("Analysis Parsing Error", "Failed to parse the analysis result from AI service")
         
-        # Update to analyzing status
-        await storage.update_file_analysis(file_id, {'status': 'analyzing'})
+        issues = result.get('issues')
+        return {
+            **result,
+            **{name: to_count(result.get(name)) for name in RESULT_COUNTERS},
+            'issues': [issue for issue in issues if isinstance(issue, dict)] if isinstance(issues, list) else []
+        }
     
+    async def _fetch_file_content(self, s3_key: str) -> str:
+        async with s3_fetch_semaphore:
+            return await aws_service.get_file_from_s3(s3_key)
     
-    def _distribute_issues_across_files(self, analysis_result: Dict[str, Any], file_names: List[str]) -> Dict[str, Dict[str, Any]]:
-        """Distribute issues across files"""
-        result = {}
+    async def _process_file(self, index: int, file: FileAnalysis) -> Tuple[int, str]:
+        """Mark a file as processing and read its content, returns the content with the file's position"""
+        if update_file_analysis_sync:
+            update_file_analysis_sync(file.id, {'status': 'processing'})
+        else:
+            await storage.update_file_analysis(file.id, {'status': 'processing'})
         
-        # Initialize each file with empty results
-        for file_name in file_names:
-            result[file_name] = {
-                'passedChecks': 0,
-                'warnings': 0,
-                'errors': 0,
-                'issues': []
-            }
+        # Get actual file content from uploads, a failed read only loses this file's content
+        try:
+            content = await self._fetch_file_content(file.s3Key)
+        except Exception as e:
+            logger.error("Error reading file %s: %s", file.fileName, e)
+            content = "// Error: Could not read file content"
         
-        # Distribute issues based on file names mentioned in the issues
-        if analysis_result.get('issues'):
-            for issue in analysis_result['issues']:
-                target_file = issue.get('file', file_names[0])  # Default to first file if not specified
-                
-                if target_file in result:
-                    result[target_file]['issues'].append(issue)
-                    
-                    # Update counters based on issue type
-                    issue_type = issue.get('type')
-                    if issue_type == 'error':
-                        result[target_file]['errors'] += 1
-                    elif issue_type == 'warning':
-                        result[target_file]['warnings'] += 1
-                    elif issue_type == 'success':
-                        result[target_file]['passedChecks'] += 1
+        return index, content
+    
+    def _distribute_issues_across_files(self, analysis_result: Dict[str, Any], file_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Distribute issues across files"""
+        issues_by_file: Dict[str, List[Dict[str, Any]]] = {file_name: [] for file_name in file_names}
+        counts: Counter = Counter()
+        default_file = file_names[0]  # Default to first file if not specified
         
-        # Distribute overall metrics
-        total_files = len(file_names)
-        passed_per_file = (analysis_result.get('passedChecks', 0)) // total_files
+        # Distribute issues based on file names mentioned in the issues, counting them by (file, type)
+        for issue in analysis_result['issues']:
+            target_file = issue.get('file', default_file)
+            file_issues = issues_by_file.get(target_file)
+            if file_issues is not None:
+                file_issues.append(issue)
+                counts[target_file, issue.get('type')] += 1
         
-        for file_name in file_names:
-            if result[file_name]['passedChecks'] == 0:
-                result[file_name]['passedChecks'] = passed_per_file
+        # Files without success issues get an even share of the overall passed checks
+        passed_per_file = analysis_result['passedChecks'] // len(file_names)
         
-        return result
+        return {
+            file_name: {
+                'passedChecks': counts[file_name, 'success'] or passed_per_file,
+                'warnings': counts[file_name, 'warning'],
+                'errors': counts[file_name, 'error'],
+                'issues': issues_by_file[file_name]
+            }
+            for file_name in file_names
+        }
 
 # Create the file processor instance
 file_processor = FileProcessor()
\ No newline at end of file
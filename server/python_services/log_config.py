@@ -0,0 +1,16 @@
+"""
+Logging setup shared by the web server and the arq worker
+"""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+def configure_logging() -> QueueListener:
+    """
+    Route log records through a queue, returns the listener that does the
+    blocking stdout writes on its own thread. The caller starts and stops it.
+    """
+    log_queue: queue.Queue = queue.Queue(-1)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s", handlers=[QueueHandler(log_queue)])
+    return QueueListener(log_queue, logging.StreamHandler())
@@ -0,0 +1,45 @@
+"""
+Redis-backed work queue that hands session processing to dedicated arq workers
+"""
+
+import os
+from typing import Optional
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from .cache_service import REDIS_URL
+
+# Opt-in: the queue needs a running worker (arq server.worker.WorkerSettings)
+# and a Redis server shared with the web process
+USE_TASK_QUEUE = os.environ.get('TASK_QUEUE') == 'arq' and bool(REDIS_URL)
+
+def get_redis_settings() -> RedisSettings:
+    return RedisSettings.from_dsn(REDIS_URL or 'redis://localhost:6379')
+
+class TaskQueue:
+    """Enqueues analysis jobs when the arq queue is enabled"""
+    
+    def __init__(self):
+        self.pool: Optional[ArqRedis] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.pool is not None
+    
+    async def connect(self) -> None:
+        if USE_TASK_QUEUE and not self.pool:
+            self.pool = await create_pool(get_redis_settings())
+    
+    async def close(self) -> None:
+        if self.pool:
+            await self.pool.aclose()
+            self.pool = None
+    
+    async def enqueue_session(self, session_id: str) -> None:
+        """Queue a session for processing by an arq worker"""
+        if not self.pool:
+            raise Exception('Task queue not configured. Please set TASK_QUEUE=arq and REDIS_URL.')
+        
+        await self.pool.enqueue_job('process_session_task', session_id)
+
+# Create the task queue instance
+task_queue = TaskQueue()
@@ -3,12 +3,18 @@ Python storage implementation that replicates the TypeScript storage interface
 """
 
 import uuid
+from dataclasses import dataclass, field, fields, replace
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-from pydantic import BaseModel
+from datetime import datetime, timezone
+import orjson
+import msgpack
+from redis.exceptions import WatchError
+from .python_services.cache_service import redis_client
 
-# Pydantic models for data structures (equivalent to TypeScript interfaces)
-class FileAnalysis(BaseModel):
+# Record types for data structures (equivalent to TypeScript interfaces). Plain
+# slotted dataclasses, every write is a cheap copy with no validation pass.
+@dataclass(slots=True, kw_only=True)
+class FileAnalysis:
     id: str
     sessionId: str
     fileName: str
@@ -20,26 +26,45 @@ class FileAnalysis(BaseModel):
     createdAt: datetime
     completedAt: Optional[datetime] = None
 
-class AnalysisSession(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AnalysisSession:
     id: str
     status: str = "pending"  # pending, processing, completed, error
     totalFiles: int = 0
     processedFiles: int = 0
     createdAt: datetime
     completedAt: Optional[datetime] = None
+    # Rolling aggregates over the session's files, maintained on every file write
+    fileStatusCounts: Dict[str, int] = field(default_factory=dict)
+    totalSize: int = 0
+    passedChecks: int = 0
+    warnings: int = 0
+    errors: int = 0
 
-class FileAnalysisCreate(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class FileAnalysisCreate:
     sessionId: str
     fileName: str
     fileSize: int
     fileType: str
     s3Key: str
     status: str = "uploading"
+    # Optional so a batch of records can share one timestamp taken by the caller
+    createdAt: Optional[datetime] = None
 
-class AnalysisSessionCreate(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class AnalysisSessionCreate:
     status: str = "pending"
     totalFiles: int = 0
     processedFiles: int = 0
+    createdAt: Optional[datetime] = None
+
+def record_fields(record: Any) -> Dict[str, Any]:
+    """Shallow field name -> value mapping of a record, unlike dataclasses.asdict it does not copy nested values"""
+    return {f.name: getattr(record, f.name) for f in fields(record)}
+
+# State a file returns to when its session is analyzed again
+FILE_RESET_FIELDS: Dict[str, Any] = {'status': 'uploaded', 'analysisResult': None, 'completedAt': None}
 
 class IStorage:
     """Storage interface that matches the TypeScript IStorage interface"""
@@ -50,7 +75,7 @@ class IStorage:
     async def get_analysis_session(self, id: str) -> Optional[AnalysisSession]:
         raise NotImplementedError
     
-    async def update_analysis_session(self, id: str, updates: Dict[str, Any]) -> Optional[AnalysisSession]:
+    async def update_analysis_session(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[AnalysisSession]:
         raise NotImplementedError
     
     async def create_file_analysis(self, file: FileAnalysisCreate) -> FileAnalysis:
@@ -65,11 +90,31 @@ class IStorage:
     async def get_file_analysis_by_s3_key(self, s3_key: str) -> Optional[FileAnalysis]:
         raise NotImplementedError
     
-    async def update_file_analysis(self, id: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+    async def update_file_analysis(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[FileAnalysis]:
         raise NotImplementedError
     
     async def update_file_analysis_by_s3_key(self, s3_key: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
         raise NotImplementedError
+    
+    async def transition_file_analysis(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+        """Apply updates only if the file's status is still from_status. Returns None if it is not (or the file is missing)."""
+        raise NotImplementedError
+    
+    async def transition_analysis_session(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[AnalysisSession]:
+        """Apply updates only if the session's status is still from_status. Returns None if another writer won."""
+        raise NotImplementedError
+    
+    async def bulk_update_file_analyses(self, updates: Dict[str, Dict[str, Any]], now: Optional[datetime] = None) -> List[FileAnalysis]:
+        """Apply per-file updates (file id -> updates) in one storage round. Unknown ids are skipped."""
+        raise NotImplementedError
+    
+    async def get_analysis_results_by_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """Analysis results of the session's files that have one, in file order"""
+        raise NotImplementedError
+    
+    async def reset_files_for_session(self, session_id: str) -> int:
+        """Return every file of the session to 'uploaded' with no result, in one bulk write. Returns the file count."""
+        raise NotImplementedError
 
 class MemStorage(IStorage):
     """In-memory storage implementation that replicates the TypeScript MemStorage"""
@@ -77,6 +122,11 @@ class MemStorage(IStorage):
     def __init__(self):
         self.analysis_sessions: Dict[str, AnalysisSession] = {}
         self.file_analyses: Dict[str, FileAnalysis] = {}
+        # Secondary indexes: session id -> its file records keyed by id (dicts
+        # keep creation order and an update re-points the slot in place),
+        # and S3 key -> file id
+        self.session_index: Dict[str, Dict[str, FileAnalysis]] = {}
+        self.s3_key_index: Dict[str, str] = {}
     
     async def create_analysis_session(self, session: AnalysisSessionCreate) -> AnalysisSession:
         session_id = str(uuid.uuid4())
@@ -85,7 +135,7 @@ class MemStorage(IStorage):
             status=session.status or 'pending',
             totalFiles=session.totalFiles or 0,
             processedFiles=session.processedFiles or 0,
-            createdAt=datetime.utcnow(),
+            createdAt=session.createdAt or datetime.now(timezone.utc),
             completedAt=None
         )
         self.analysis_sessions[session_id] = new_session
@@ -94,20 +144,16 @@ class MemStorage(IStorage):
     async def get_analysis_session(self, id: str) -> Optional[AnalysisSession]:
         return self.analysis_sessions.get(id)
     
-    async def update_analysis_session(self, id: str, updates: Dict[str, Any]) -> Optional[AnalysisSession]:
+    async def update_analysis_session(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[AnalysisSession]:
         session = self.analysis_sessions.get(id)
         if not session:
             return None
         
-        # Create updated session data
-        session_data = session.model_dump()
-        session_data.update(updates)
-        
         # Set completedAt if status is completed
         if updates.get('status') == 'completed' and not session.completedAt:
-            session_data['completedAt'] = datetime.utcnow()
+            updates = {**updates, 'completedAt': now or datetime.now(timezone.utc)}
         
-        updated_session = AnalysisSession(**session_data)
+        updated_session = replace(session, **updates)
         self.analysis_sessions[id] = updated_session
         return updated_session
     
@@ -122,50 +168,462 @@ class MemStorage(IStorage):
             s3Key=file.s3Key,
             status=file.status or 'uploading',
             analysisResult=None,
-            createdAt=datetime.utcnow(),
+            createdAt=file.createdAt or datetime.now(timezone.utc),
             completedAt=None
         )
-        self.file_analyses[file_id] = file_analysis
+        self._store_file(file_analysis)
+        self.s3_key_index[file.s3Key] = file_id
+        self._track_file(file_analysis, 1)
         return file_analysis
     
     async def get_file_analysis(self, id: str) -> Optional[FileAnalysis]:
         return self.file_analyses.get(id)
     
     async def get_file_analysis_by_session(self, session_id: str) -> List[FileAnalysis]:
+        return self.get_file_analysis_by_session_sync(session_id)
+    
+    def get_file_analysis_by_session_sync(self, session_id: str) -> List[FileAnalysis]:
+        session_files = self.session_index.get(session_id)
+        return list(session_files.values()) if session_files else []
+    
+    async def get_analysis_results_by_session(self, session_id: str) -> List[Dict[str, Any]]:
         return [
-            file_analysis for file_analysis in self.file_analyses.values()
-            if file_analysis.sessionId == session_id
+            file_analysis.analysisResult for file_analysis in self.get_file_analysis_by_session_sync(session_id)
+            if file_analysis.analysisResult
         ]
     
     async def get_file_analysis_by_s3_key(self, s3_key: str) -> Optional[FileAnalysis]:
-        for file_analysis in self.file_analyses.values():
-            if file_analysis.s3Key == s3_key:
-                return file_analysis
-        return None
+        file_id = self.s3_key_index.get(s3_key)
+        return self.file_analyses.get(file_id) if file_id else None
     
-    async def update_file_analysis(self, id: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+    async def update_file_analysis(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[FileAnalysis]:
+        return self.update_file_analysis_sync(id, updates, now)
+    
+    def update_file_analysis_sync(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[FileAnalysis]:
         file_analysis = self.file_analyses.get(id)
         if not file_analysis:
             return None
         
-        # Create updated file analysis data
-        file_data = file_analysis.model_dump()
-        file_data.update(updates)
+        return self._apply_file_update(file_analysis, updates, now)
+    
+    async def bulk_update_file_analyses(self, updates: Dict[str, Dict[str, Any]], now: Optional[datetime] = None) -> List[FileAnalysis]:
+        now = now or datetime.now(timezone.utc)
+        return [
+            self._apply_file_update(self.file_analyses[file_id], file_updates, now)
+            for file_id, file_updates in updates.items()
+            if file_id in self.file_analyses
+        ]
+    
+    async def update_file_analysis_by_s3_key(self, s3_key: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+        file_analysis = await self.get_file_analysis_by_s3_key(s3_key)
+        if not file_analysis:
+            return None
+        
+        return self.update_file_analysis_sync(file_analysis.id, updates)
+    
+    async def transition_file_analysis(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+        file_analysis = self.file_analyses.get(id)
+        if not file_analysis or file_analysis.status != from_status:
+            return None
+        
+        return self._apply_file_update(file_analysis, updates, None)
+    
+    async def transition_analysis_session(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[AnalysisSession]:
+        # The check and the write run without yielding to the event loop
+        session = self.analysis_sessions.get(id)
+        if not session or session.status != from_status:
+            return None
         
+        return await self.update_analysis_session(id, updates)
+    
+    async def reset_files_for_session(self, session_id: str) -> int:
+        session_files = self.get_file_analysis_by_session_sync(session_id)
+        for file_analysis in session_files:
+            reset_file = replace(file_analysis, **FILE_RESET_FIELDS)
+            self._store_file(reset_file)
+            self._track_file(file_analysis, -1)
+            self._track_file(reset_file, 1)
+        return len(session_files)
+    
+    def _apply_file_update(self, file_analysis: FileAnalysis, updates: Dict[str, Any], now: Optional[datetime]) -> FileAnalysis:
         # Set completedAt if status is completed
         if updates.get('status') == 'completed' and not file_analysis.completedAt:
-            file_data['completedAt'] = datetime.utcnow()
+            updates = {**updates, 'completedAt': now or datetime.now(timezone.utc)}
         
-        updated_file = FileAnalysis(**file_data)
-        self.file_analyses[id] = updated_file
+        updated_file = replace(file_analysis, **updates)
+        self._store_file(updated_file)
+        if updated_file.s3Key != file_analysis.s3Key:
+            self.s3_key_index.pop(file_analysis.s3Key, None)
+            self.s3_key_index[updated_file.s3Key] = file_analysis.id
+        self._track_file(file_analysis, -1)
+        self._track_file(updated_file, 1)
         return updated_file
     
+    def _store_file(self, file_analysis: FileAnalysis) -> None:
+        self.file_analyses[file_analysis.id] = file_analysis
+        self.session_index.setdefault(file_analysis.sessionId, {})[file_analysis.id] = file_analysis
+    
+    def _track_file(self, file_analysis: FileAnalysis, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) a file's contribution to its session aggregates"""
+        session = self.analysis_sessions.get(file_analysis.sessionId)
+        if not session:
+            return
+        
+        counts = session.fileStatusCounts
+        counts[file_analysis.status] = counts.get(file_analysis.status, 0) + sign
+        session.totalSize += sign * file_analysis.fileSize
+        
+        result = file_analysis.analysisResult
+        if result:
+            session.passedChecks += sign * result.get('passedChecks', 0)
+            session.warnings += sign * result.get('warnings', 0)
+            session.errors += sign * result.get('errors', 0)
+
+class RedisStorage(IStorage):
+    """Redis-backed storage shared by every server and queue worker process
+
+    Sessions and files are hashes (session:{id}, file:{id}), session:{id} also
+    holds the rolling aggregates as HINCRBY counters, session_files:{id} lists
+    the file ids in creation order and s3key:{key} maps an S3 key to its file id.
+    Analysis results are stored msgpack-encoded in the file hash.
+    """
+    
+    # Records are working state for an analysis run, not an archive
+    KEY_TTL_SECONDS = 86400
+    
+    # Hash fields come back as bytes, these are converted back from their text form
+    INT_FIELDS = frozenset({'fileSize', 'totalFiles', 'processedFiles', 'totalSize', 'passedChecks', 'warnings', 'errors'})
+    DATETIME_FIELDS = frozenset({'createdAt', 'completedAt'})
+    # Only these fields can hold None, stored as an empty string
+    OPTIONAL_FIELDS = frozenset({'completedAt', 'analysisResult'})
+    
+    def __init__(self, client):
+        self.redis = client
+    
+    async def create_analysis_session(self, session: AnalysisSessionCreate) -> AnalysisSession:
+        session_id = str(uuid.uuid4())
+        new_session = AnalysisSession(
+            id=session_id,
+            status=session.status or 'pending',
+            totalFiles=session.totalFiles or 0,
+            processedFiles=session.processedFiles or 0,
+            createdAt=session.createdAt or datetime.now(timezone.utc),
+            completedAt=None
+        )
+        key = f"session:{session_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            session_fields = record_fields(new_session)
+            del session_fields['fileStatusCounts']
+            pipe.hset(key, mapping=self._encode(session_fields))
+            pipe.expire(key, self.KEY_TTL_SECONDS)
+            await pipe.execute()
+        return new_session
+    
+    async def get_analysis_session(self, id: str) -> Optional[AnalysisSession]:
+        raw = await self.redis.hgetall(f"session:{id}")
+        return self._decode_session(raw) if raw else None
+    
+    async def update_analysis_session(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[AnalysisSession]:
+        session = await self.get_analysis_session(id)
+        if not session:
+            return None
+        
+        changes = self._session_changes(session, updates, now)
+        if changes:
+            await self.redis.hset(f"session:{id}", mapping=self._encode(changes))
+        
+        return replace(session, **changes)
+    
+    async def transition_analysis_session(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[AnalysisSession]:
+        session_key = f"session:{id}"
+        
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(session_key)
+                    session = await self.get_analysis_session(id)
+                    if not session or session.status != from_status:
+                        return None
+                    
+                    changes = self._session_changes(session, updates, None)
+                    pipe.multi()
+                    if changes:
+                        pipe.hset(session_key, mapping=self._encode(changes))
+                        await pipe.execute()
+                    return replace(session, **changes)
+                except WatchError:
+                    continue
+    
+    @staticmethod
+    def _session_changes(session: AnalysisSession, updates: Dict[str, Any], now: Optional[datetime]) -> Dict[str, Any]:
+        """The session fields an update writes"""
+        changes = dict(updates)
+        
+        # Set completedAt if status is completed
+        if updates.get('status') == 'completed' and not session.completedAt:
+            changes['completedAt'] = now or datetime.now(timezone.utc)
+        
+        # Aggregates are only ever moved by file writes
+        changes.pop('fileStatusCounts', None)
+        return changes
+    
+    async def create_file_analysis(self, file: FileAnalysisCreate) -> FileAnalysis:
+        file_id = str(uuid.uuid4())
+        file_analysis = FileAnalysis(
+            id=file_id,
+            sessionId=file.sessionId,
+            fileName=file.fileName,
+            fileSize=file.fileSize,
+            fileType=file.fileType,
+            s3Key=file.s3Key,
+            status=file.status or 'uploading',
+            analysisResult=None,
+            createdAt=file.createdAt or datetime.now(timezone.utc),
+            completedAt=None
+        )
+        key = f"file:{file_id}"
+        files_key = f"session_files:{file.sessionId}"
+        s3_key = f"s3key:{file.s3Key}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    live_sessions = await self._watch_sessions(pipe, [file.sessionId])
+                    pipe.multi()
+                    pipe.hset(key, mapping=self._encode(record_fields(file_analysis)))
+                    pipe.rpush(files_key, file_id)
+                    pipe.set(s3_key, file_id)
+                    for name in (key, files_key, s3_key):
+                        pipe.expire(name, self.KEY_TTL_SECONDS)
+                    if file.sessionId in live_sessions:
+                        self._queue_counters(pipe, file_analysis, 1)
+                    await pipe.execute()
+                    return file_analysis
+                except WatchError:
+                    continue
+    
+    async def get_file_analysis(self, id: str) -> Optional[FileAnalysis]:
+        raw = await self.redis.hgetall(f"file:{id}")
+        return self._decode_file(raw) if raw else None
+    
+    async def get_file_analysis_by_session(self, session_id: str) -> List[FileAnalysis]:
+        file_ids = await self.redis.lrange(f"session_files:{session_id}", 0, -1)
+        if not file_ids:
+            return []
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for file_id in file_ids:
+                pipe.hgetall(f"file:{file_id.decode()}")
+            rows = await pipe.execute()
+        
+        return [self._decode_file(raw) for raw in rows if raw]
+    
+    async def get_analysis_results_by_session(self, session_id: str) -> List[Dict[str, Any]]:
+        file_ids = await self.redis.lrange(f"session_files:{session_id}", 0, -1)
+        if not file_ids:
+            return []
+        
+        # Fetch only the packed result blobs, not the whole file records
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for file_id in file_ids:
+                pipe.hget(f"file:{file_id.decode()}", 'analysisResult')
+            blobs = await pipe.execute()
+        
+        return [msgpack.unpackb(blob, raw=False) for blob in blobs if blob]
+    
+    async def get_file_analysis_by_s3_key(self, s3_key: str) -> Optional[FileAnalysis]:
+        file_id = await self.redis.get(f"s3key:{s3_key}")
+        if not file_id:
+            return None
+        return await self.get_file_analysis(file_id.decode())
+    
+    async def update_file_analysis(self, id: str, updates: Dict[str, Any], now: Optional[datetime] = None) -> Optional[FileAnalysis]:
+        updated_files = await self._update_files({id: updates}, now)
+        return updated_files[0] if updated_files else None
+    
+    async def bulk_update_file_analyses(self, updates: Dict[str, Dict[str, Any]], now: Optional[datetime] = None) -> List[FileAnalysis]:
+        return await self._update_files(updates, now or datetime.now(timezone.utc))
+    
     async def update_file_analysis_by_s3_key(self, s3_key: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
         file_analysis = await self.get_file_analysis_by_s3_key(s3_key)
         if not file_analysis:
             return None
         
         return await self.update_file_analysis(file_analysis.id, updates)
+    
+    async def transition_file_analysis(self, id: str, from_status: str, updates: Dict[str, Any]) -> Optional[FileAnalysis]:
+        updated_files = await self._update_files({id: updates}, None, from_status)
+        return updated_files[0] if updated_files else None
+    
+    async def reset_files_for_session(self, session_id: str) -> int:
+        session = await self.get_analysis_session(session_id)
+        file_ids = await self.redis.lrange(f"session_files:{session_id}", 0, -1)
+        if not session or not file_ids:
+            return 0
+        
+        session_key = f"session:{session_id}"
+        reset_fields = self._encode(FILE_RESET_FIELDS)
+        
+        # Every file ends up in the same state, so the aggregates can be set outright.
+        # A file write landing in between would be lost, so the transaction is retried.
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(session_key)
+                    session = await self.get_analysis_session(session_id)
+                    if not session:
+                        return 0
+                    pipe.multi()
+                    for file_id in file_ids:
+                        pipe.hset(f"file:{file_id.decode()}", mapping=reset_fields)
+                    stale_counts = [f"count:{status}" for status in session.fileStatusCounts]
+                    if stale_counts:
+                        pipe.hdel(session_key, *stale_counts)
+                    pipe.hset(session_key, mapping={
+                        f"count:{FILE_RESET_FIELDS['status']}": len(file_ids),
+                        'passedChecks': 0,
+                        'warnings': 0,
+                        'errors': 0
+                    })
+                    await pipe.execute()
+                    return len(file_ids)
+                except WatchError:
+                    continue
+    
+    async def _update_files(self, updates: Dict[str, Dict[str, Any]], now: Optional[datetime], from_status: Optional[str] = None) -> List[FileAnalysis]:
+        """Apply file updates (file id -> updates) and move their session aggregates in one transaction
+
+        The file records are watched while they are read, so if another writer
+        changes one of them before the transaction runs it is retried against
+        the new state. The counter deltas are always taken from the stored record.
+        With from_status, files whose stored status differs are left untouched.
+        The counters of a session whose hash has expired are not recreated.
+        """
+        file_ids = list(updates)
+        if not file_ids:
+            return []
+        keys = [f"file:{file_id}" for file_id in file_ids]
+        
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(*keys)
+                    async with self.redis.pipeline(transaction=False) as reads:
+                        for key in keys:
+                            reads.hgetall(key)
+                        rows = await reads.execute()
+                    
+                    files = [(file_id, self._decode_file(raw)) for file_id, raw in zip(file_ids, rows) if raw]
+                    live_sessions = await self._watch_sessions(pipe, list({file.sessionId for _, file in files}))
+                    
+                    pipe.multi()
+                    updated_files = [
+                        self._queue_file_update(pipe, file, updates[file_id], now, file.sessionId in live_sessions)
+                        for file_id, file in files
+                        if from_status is None or file.status == from_status
+                    ]
+                    if updated_files:
+                        await pipe.execute()
+                    return updated_files
+                except WatchError:
+                    continue
+    
+    async def _watch_sessions(self, pipe, session_ids: List[str]) -> set:
+        """WATCH the session hashes on a transaction pipeline, returns the ids whose hash still exists"""
+        if not session_ids:
+            return set()
+        keys = [f"session:{session_id}" for session_id in session_ids]
+        await pipe.watch(*keys)
+        async with self.redis.pipeline(transaction=False) as reads:
+            for key in keys:
+                reads.exists(key)
+            found = await reads.execute()
+        return {session_id for session_id, exists in zip(session_ids, found) if exists}
+    
+    def _queue_file_update(self, pipe, file_analysis: FileAnalysis, updates: Dict[str, Any], now: Optional[datetime], counters: bool = True) -> FileAnalysis:
+        """Queue the writes for one file update on a transaction pipeline, returns the updated record"""
+        changes = dict(updates)
+        
+        # Set completedAt if status is completed
+        if updates.get('status') == 'completed' and not file_analysis.completedAt:
+            changes['completedAt'] = now or datetime.now(timezone.utc)
+        
+        updated_file = replace(file_analysis, **changes)
+        
+        pipe.hset(f"file:{file_analysis.id}", mapping=self._encode(changes))
+        if updated_file.s3Key != file_analysis.s3Key:
+            pipe.delete(f"s3key:{file_analysis.s3Key}")
+            pipe.set(f"s3key:{updated_file.s3Key}", file_analysis.id, ex=self.KEY_TTL_SECONDS)
+        if counters:
+            self._queue_counters(pipe, file_analysis, -1)
+            self._queue_counters(pipe, updated_file, 1)
+        return updated_file
+    
+    def _queue_counters(self, pipe, file_analysis: FileAnalysis, sign: int) -> None:
+        """Queue HINCRBYs adding (sign=1) or removing (sign=-1) a file's contribution to its session aggregates
+
+        Only for a session whose hash is watched and known to exist, HINCRBY
+        would otherwise create a partial session hash.
+        """
+        key = f"session:{file_analysis.sessionId}"
+        pipe.hincrby(key, f"count:{file_analysis.status}", sign)
+        pipe.hincrby(key, 'totalSize', sign * file_analysis.fileSize)
+        
+        result = file_analysis.analysisResult
+        if result:
+            pipe.hincrby(key, 'passedChecks', sign * result.get('passedChecks', 0))
+            pipe.hincrby(key, 'warnings', sign * result.get('warnings', 0))
+            pipe.hincrby(key, 'errors', sign * result.get('errors', 0))
+        pipe.expire(key, self.KEY_TTL_SECONDS)
+    
+    def _encode(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert record fields to values Redis can store, None becomes an empty string"""
+        encoded = {}
+        for name, value in data.items():
+            if value is None:
+                encoded[name] = ''
+            elif isinstance(value, datetime):
+                encoded[name] = value.isoformat()
+            elif name == 'analysisResult':
+                encoded[name] = msgpack.packb(value, use_bin_type=True)
+            elif isinstance(value, (dict, list)):
+                encoded[name] = orjson.dumps(value)
+            else:
+                encoded[name] = value
+        return encoded
+    
+    def _decode_session(self, raw: Dict[bytes, bytes]) -> AnalysisSession:
+        data: Dict[str, Any] = {}
+        counts: Dict[str, int] = {}
+        for name, value in raw.items():
+            name = name.decode()
+            if name.startswith('count:'):
+                counts[name[len('count:'):]] = int(value)
+            else:
+                data[name] = self._decode_value(name, value)
+        data['fileStatusCounts'] = counts
+        return AnalysisSession(**data)
+    
+    def _decode_file(self, raw: Dict[bytes, bytes]) -> FileAnalysis:
+        # The packed result is binary, decode it before the text fields
+        result = raw.pop(b'analysisResult', None)
+        data: Dict[str, Any] = {}
+        for name, value in raw.items():
+            name = name.decode()
+            data[name] = self._decode_value(name, value)
+        data['analysisResult'] = msgpack.unpackb(result, raw=False) if result else None
+        return FileAnalysis(**data)
+    
+    def _decode_value(self, name: str, value: bytes) -> Any:
+        """Convert a stored hash field back to its record type, an empty optional field is None"""
+        text = value.decode()
+        if not text and name in self.OPTIONAL_FIELDS:
+            return None
+        if name in self.INT_FIELDS:
+            return int(text)
+        if name in self.DATETIME_FIELDS:
+            return datetime.fromisoformat(text)
+        return text
 
-# Create the storage instance (equivalent to TypeScript export const storage = new MemStorage())
-storage = MemStorage()
\ No newline at end of file
+# Create the storage instance (equivalent to TypeScript export const storage = new MemStorage()).
+# With Redis configured every worker process shares one store.
+storage: IStorage = RedisStorage(redis_client) if redis_client else MemStorage()
\ No newline at end of file
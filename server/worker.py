@@ -0,0 +1,34 @@
+"""
+arq worker that runs session analysis outside the web server process
+
+Run with: arq server.worker.WorkerSettings
+"""
+
+from typing import Any, Dict
+from dotenv import load_dotenv
+load_dotenv()
+
+from server.python_services.file_processor import file_processor
+from server.python_services.cache_service import cache_service
+from server.python_services.aws_service import aws_service
+from server.python_services.task_queue import get_redis_settings
+from server.python_services.log_config import configure_logging
+
+async def process_session_task(ctx: Dict[str, Any], session_id: str) -> None:
+    await file_processor.process_session(session_id)
+
+async def startup(ctx: Dict[str, Any]) -> None:
+    # Same queued logging as the web server, so processing logs reach stdout at INFO
+    ctx['log_listener'] = configure_logging()
+    ctx['log_listener'].start()
+
+async def shutdown(ctx: Dict[str, Any]) -> None:
+    await cache_service.close()
+    await aws_service.close()
+    ctx['log_listener'].stop()
+
+class WorkerSettings:
+    functions = [process_session_task]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = get_redis_settings()
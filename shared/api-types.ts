@@ -9,4 +9,16 @@ export interface AnalysisStatusResponse {
   ecsCompleted: boolean;
   bedrockCompleted: boolean;
   uploadTime?: number;
-}
\ No newline at end of file
+}
+export interface PresignedUpload {
+  fileId: string;
+  fileName: string;
+  s3Key: string;
+  url: string;
+  headers: Record<string, string>;
+}
+
+export interface PresignedUploadResponse {
+  sessionId: string;
+  uploads: PresignedUpload[];
+}
@@ -4,26 +4,133 @@ CloudShell Test Script for CodeReview AI Pipeline
 Tests the complete S3 → Lambda → ECS → Bedrock workflow
 """
 
+import argparse
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+import gzip
+import io
 import json
+import logging
+import queue
+import sys
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+# orjson is optional, the stock CloudShell Python only has the standard library
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Configuration
 BUCKET_NAME = "codereview-ai-files-108782072033"
 REGION = "us-east-1"
 BEDROCK_MODEL = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+# Ask Bedrock for latency-optimized inference (falls back to standard latency
+# when the model does not offer it), set to False to always use standard
+LATENCY_OPTIMIZED = True
+# Gzip the test files on upload (stored with Content-Encoding: gzip). Off by
+# default since the Lambda and the ECS analyzer read objects as plain text.
+COMPRESS_UPLOADS = False
+LAMBDA_LOG_GROUP = "/aws/lambda/codereview-ai-processor"
+# How long to wait for the Lambda to log the test session, and the
+# initial and maximum delay between log polls (seconds)
+LAMBDA_WAIT_TIMEOUT = 15
+LAMBDA_POLL_INTERVAL = 0.5
+LAMBDA_POLL_MAX_INTERVAL = 2
 
-# Initialize AWS clients
-s3_client = boto3.client('s3', region_name=REGION)
-bedrock_client = boto3.client('bedrock-runtime', region_name=REGION)
-lambda_client = boto3.client('lambda', region_name=REGION)
+# Keep pooled connections alive between calls, leave room in the pool for the
+# concurrent uploads, and allow long Bedrock generations before timing out
+AWS_CLIENT_CONFIG = Config(
+    region_name=REGION,
+    tcp_keepalive=True,
+    retries={'mode': 'standard', 'max_attempts': 3},
+    connect_timeout=5,
+    read_timeout=120,
+    max_pool_connections=32
+)
 
-def create_test_files():
-    """Create sample code files for testing - Folder with interdependent files"""
-    files = {
-        "UserProfile.jsx": '''// React component with multiple issues
+# Test output is queued and a listener thread does the blocking terminal writes,
+# so the upload and Bedrock work never waits on stdout. Records carry their own
+# line endings so streamed response text can be written as it arrives.
+output_queue: queue.Queue = queue.Queue(-1)
+output_handler = logging.StreamHandler(sys.stdout)
+output_handler.terminator = ''
+output_listener = QueueListener(output_queue, output_handler)
+logger = logging.getLogger('pipeline')
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(output_queue))
+logger.propagate = False
+
+# Reused to pull the JSON object out of Claude's response
+JSON_DECODER = json.JSONDecoder()
+
+# Files over 8 MiB are uploaded as 8 MiB parts, up to 10 in flight per file.
+# Smaller files go out as a single put_object.
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10
+)
+
+# AWS clients come from one shared session and are only created on first use,
+# so a run only loads the service models of the tests it actually performs
+aws_session = boto3.session.Session()
+aws_clients = {}
+aws_clients_lock = threading.Lock()
+
+def get_client(service_name: str):
+    """Return the shared client for an AWS service, creating it on first use"""
+    # Creating clients is not thread-safe, the upload workers may ask at the same time
+    with aws_clients_lock:
+        if service_name not in aws_clients:
+            aws_clients[service_name] = aws_session.client(service_name, config=AWS_CLIENT_CONFIG)
+        return aws_clients[service_name]
+
+# Static part of the analysis prompt, the file listing is substituted for %s
+PROMPT_TEMPLATE = """You are an expert code reviewer. Analyze the following code files and provide a comprehensive review. Focus on:
+
+1. Code structure and architecture
+2. Missing error handling  
+3. Unused imports or variables
+4. Performance optimizations
+5. Security vulnerabilities
+6. Best practices adherence
+
+Please respond with a JSON object in this exact format:
+{
+  "passedChecks": number,
+  "warnings": number,
+  "errors": number,
+  "issues": [
+    {
+      "type": "error|warning|success|suggestion",
+      "severity": "low|medium|high|critical", 
+      "title": "Issue title",
+      "description": "Detailed description",
+      "file": "filename",
+      "line": number (optional),
+      "code": "problematic code snippet (optional)",
+      "suggestion": "suggested fix (optional)"
+    }
+  ]
+}
+
+Code Files:
+%s
+
+Please provide a thorough analysis and return only the JSON response."""
+
+
+# Interdependent sample code files for testing, as (name, content) pairs
+TEST_FILES = (
+    ("UserProfile.jsx", '''// React component with multiple issues
 import React, { useState, useEffect } from 'react';
 import { getUserData, formatUserName } from './userHelpers';  // Dependencies
 import { updateProfile, deleteUser } from './apiRoutes';  // API dependency
@@ -88,9 +195,9 @@ const UserProfile = ({ userId }) => {
 };
 
 export default UserProfile;
-''',
-        
-        "userHelpers.js": '''// Helper functions with various issues
+'''),
+    
+    ("userHelpers.js", '''// Helper functions with various issues
 import axios from 'axios';
 
 // BUG: No input validation
@@ -141,9 +248,9 @@ window.userCache = {};
 export const calculateUserAge = (birthDate) => {
     return new Date().getFullYear() - new Date(birthDate).getFullYear();
     // BUG: Doesn't account for birth month/day
-};''',
-        
-        "apiRoutes.js": '''// API routes with security and error handling issues
+};'''),
+    
+    ("apiRoutes.js", '''// API routes with security and error handling issues
 const express = require('express');
 const router = express.Router();
 
@@ -208,239 +315,341 @@ router.delete('/users/:id', (req, res) => {
 // BUG: No error handling middleware
 
 module.exports = router;
-'''
-    }
-    return files
+''')
+)
+
+def create_test_files():
+    """Create sample code files for testing - Folder with interdependent files"""
+    return dict(TEST_FILES)
 
-def upload_test_files_to_s3(session_id: str, files: dict):
-    """Upload test files to S3"""
-    print(f"📤 Uploading test files to S3 for session: {session_id}")
+def upload_test_files_to_s3(session_id: str, files: dict, log: list = None):
+    """Upload test files to S3, progress lines are collected in log instead of printed when given"""
+    emit = report if log is None else log.append
+    emit(f"📤 Uploading test files to S3 for session: {session_id}")
+    s3_client = get_client('s3')
     
-    uploaded_keys = []
-    for filename, content in files.items():
-        key = f"sessions/{session_id}/{int(time.time() * 1000)}-{filename}"
+    # One timestamp for the whole batch, also used in every key
+    uploaded_at = datetime.utcnow().isoformat()
+    key_prefix = f"sessions/{session_id}/{int(time.time() * 1000)}-"
+    
+    def upload_one(filename: str, content: str) -> str:
+        key = key_prefix + filename
+        body = content.encode('utf-8')
+        extra_args = {
+            'ContentType': 'text/plain',
+            'Metadata': {
+                'sessionId': session_id,
+                'originalName': filename,
+                'uploadedAt': uploaded_at
+            }
+        }
+        if COMPRESS_UPLOADS:
+            body = gzip.compress(body, compresslevel=6)
+            extra_args['ContentEncoding'] = 'gzip'
         
-        try:
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=key,
-                Body=content.encode('utf-8'),
-                ContentType='text/plain',
-                Metadata={
-                    'sessionId': session_id,
-                    'originalName': filename,
-                    'uploadedAt': datetime.utcnow().isoformat()
-                }
-            )
-            uploaded_keys.append(key)
-            print(f"   ✅ Uploaded: {filename} → {key}")
-            
-        except Exception as e:
-            print(f"   ❌ Failed to upload {filename}: {e}")
+        s3_client.upload_fileobj(
+            io.BytesIO(body),
+            BUCKET_NAME,
+            key,
+            ExtraArgs=extra_args,
+            Config=S3_TRANSFER_CONFIG
+        )
+        return key
+    
+    # The S3 client is thread-safe, upload every file at once on a shared client
+    uploaded_keys = []
+    with ThreadPoolExecutor(max_workers=min(32, len(files) or 1)) as executor:
+        futures = {
+            executor.submit(upload_one, filename, content): filename
+            for filename, content in files.items()
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                key = future.result()
+                uploaded_keys.append(key)
+                emit(f"   ✅ Uploaded: {filename} → {key}")
+                
+            except Exception as e:
+                emit(f"   ❌ Failed to upload {filename}: {e}")
             
     return uploaded_keys
 
-def test_bedrock_directly(files: dict):
-    """Test Bedrock analysis directly"""
-    print(f"\n🤖 Testing Bedrock Claude 3.7 Sonnet directly...")
-    
-    # Build the analysis prompt
-    file_contents = []
-    file_names = list(files.keys())
-    
-    for filename, content in files.items():
-        file_contents.append(f"--- File: {filename} ---\n{content}\n")
-    
-    files_text = '\n'.join(file_contents)
-    
-    prompt = f"""You are an expert code reviewer. Analyze the following code files and provide a comprehensive review. Focus on:
+def report(message: str = '', end: str = '\n'):
+    """Write a piece of test output through the output queue"""
+    logger.info('%s%s', message, end)
 
-1. Code structure and architecture
-2. Missing error handling  
-3. Unused imports or variables
-4. Performance optimizations
-5. Security vulnerabilities
-6. Best practices adherence
+def extract_analysis_json(claude_response: str):
+    """Return the analysis JSON object from Claude's response, or None if it holds none"""
+    # Claude is asked for bare JSON, so try that first
+    try:
+        return json_loads(claude_response)
+    except ValueError:
+        pass
+    
+    # Otherwise decode the first JSON object embedded in surrounding text or a code fence
+    start = claude_response.find('{')
+    while start != -1:
+        try:
+            return JSON_DECODER.raw_decode(claude_response, start)[0]
+        except ValueError:
+            start = claude_response.find('{', start + 1)
+    return None
 
-Please respond with a JSON object in this exact format:
-{{
-  "passedChecks": number,
-  "warnings": number,
-  "errors": number,
-  "issues": [
-    {{
-      "type": "error|warning|success|suggestion",
-      "severity": "low|medium|high|critical", 
-      "title": "Issue title",
-      "description": "Detailed description",
-      "file": "filename",
-      "line": number (optional),
-      "code": "problematic code snippet (optional)",
-      "suggestion": "suggested fix (optional)"
-    }}
-  ]
-}}
+def delete_test_files_from_s3(keys: list):
+    """Delete the uploaded test files in one request"""
+    try:
+        # Quiet mode only reports the keys that failed
+        response = get_client('s3').delete_objects(
+            Bucket=BUCKET_NAME,
+            Delete={
+                'Objects': [{'Key': key} for key in keys],
+                'Quiet': True
+            }
+        )
+    except Exception as e:
+        report(f"   ⚠️ Could not delete test files: {e}")
+        return
+    
+    failed = {error['Key']: error.get('Message', error.get('Code')) for error in response.get('Errors', [])}
+    for key in keys:
+        if key in failed:
+            report(f"   ⚠️ Could not delete {key}: {failed[key]}")
+        else:
+            report(f"   🗑️ Deleted: {key}")
 
-Code Files:
-{files_text}
+@lru_cache(maxsize=16)
+def build_prompt(file_items: tuple) -> str:
+    """Build the analysis prompt for (name, content) pairs, repeated runs on the same files reuse it"""
+    # Build the file listing in a single join instead of formatting each file and joining again
+    parts = []
+    for filename, content in file_items:
+        parts.extend(("--- File: ", filename, " ---\n", content, "\n\n"))
+    
+    return PROMPT_TEMPLATE % ''.join(parts)
 
-Please provide a thorough analysis and return only the JSON response."""
+def test_bedrock_directly(files: dict):
+    """Test Bedrock analysis directly"""
+    report(f"\n🤖 Testing Bedrock Claude 3.7 Sonnet directly...")
+    
+    prompt = build_prompt(tuple(files.items()))
 
     try:
         # Call Bedrock
-        print(f"   🔄 Calling Claude 3.7 Sonnet...")
-        print(f"   📝 Model ID: {BEDROCK_MODEL}")
+        report(f"   🔄 Calling Claude 3.7 Sonnet...")
+        report(f"   📝 Model ID: {BEDROCK_MODEL}")
         
-        response = bedrock_client.invoke_model(
-            modelId=BEDROCK_MODEL,
-            contentType='application/json',
-            accept='*/*',
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4000,
-                "messages": [
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
-            })
-        )
+        bedrock_client = get_client('bedrock-runtime')
+        request = {
+            "modelId": BEDROCK_MODEL,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"text": prompt}]
+                }
+            ],
+            "inferenceConfig": {"maxTokens": 4000}
+        }
+        if LATENCY_OPTIMIZED:
+            request["performanceConfig"] = {"latency": "optimized"}
+        
+        try:
+            response = bedrock_client.converse_stream(**request)
+        except bedrock_client.exceptions.ValidationException as e:
+            if "performanceConfig" not in request:
+                raise
+            report(f"   ⚠️ Latency-optimized inference unavailable, retrying with standard latency: {e}")
+            del request["performanceConfig"]
+            response = bedrock_client.converse_stream(**request)
+        
+        report(f"\n" + "="*80)
+        report("🤖 CLAUDE 3.7 SONNET ANALYSIS RESPONSE:")
+        report("="*80)
+        
+        # Print text deltas as they arrive instead of waiting for the full completion
+        text = io.StringIO()
+        for event in response['stream']:
+            delta = event.get('contentBlockDelta')
+            if not delta:
+                continue
+            
+            chunk = delta['delta'].get('text', '')
+            text.write(chunk)
+            report(chunk, end='')
         
-        # Parse response
-        response_body = response['body'].read().decode('utf-8')
-        response_json = json.loads(response_body)
-        claude_response = response_json['content'][0]['text']
+        claude_response = text.getvalue()
+        report()
+        report("="*80)
         
-        print(f"\n🎉 Bedrock Response Received!")
-        print(f"📊 Response Length: {len(claude_response)} characters")
-        print(f"\n" + "="*80)
-        print("🤖 CLAUDE 3.7 SONNET ANALYSIS RESPONSE:")
-        print("="*80)
-        print(claude_response)
-        print("="*80)
+        report(f"\n🎉 Bedrock Response Received!")
+        report(f"📊 Response Length: {len(claude_response)} characters")
         
         # Try to parse as JSON for better formatting
         try:
-            import re
-            json_match = re.search(r'\{.*\}', claude_response, re.DOTALL)
-            if json_match:
-                analysis_json = json.loads(json_match.group(0))
-                print(f"\n📋 PARSED ANALYSIS SUMMARY:")
-                print(f"   ✅ Passed Checks: {analysis_json.get('passedChecks', 0)}")
-                print(f"   ⚠️  Warnings: {analysis_json.get('warnings', 0)}")
-                print(f"   ❌ Errors: {analysis_json.get('errors', 0)}")
-                print(f"   📝 Total Issues: {len(analysis_json.get('issues', []))}")
+            analysis_json = extract_analysis_json(claude_response)
+            if analysis_json:
+                report(f"\n📋 PARSED ANALYSIS SUMMARY:")
+                report(f"   ✅ Passed Checks: {analysis_json.get('passedChecks', 0)}")
+                report(f"   ⚠️  Warnings: {analysis_json.get('warnings', 0)}")
+                report(f"   ❌ Errors: {analysis_json.get('errors', 0)}")
+                report(f"   📝 Total Issues: {len(analysis_json.get('issues', []))}")
                 
-                print(f"\n🔍 DETAILED ISSUES:")
+                report(f"\n🔍 DETAILED ISSUES:")
                 for i, issue in enumerate(analysis_json.get('issues', []), 1):
                     icon = {"error": "❌", "warning": "⚠️", "success": "✅", "suggestion": "💡"}.get(issue.get('type'), '📝')
-                    print(f"   {i}. {icon} [{issue.get('severity', 'unknown').upper()}] {issue.get('title', 'No title')}")
-                    print(f"      📁 File: {issue.get('file', 'unknown')}")
+                    report(f"   {i}. {icon} [{issue.get('severity', 'unknown').upper()}] {issue.get('title', 'No title')}")
+                    report(f"      📁 File: {issue.get('file', 'unknown')}")
                     if issue.get('line'):
-                        print(f"      📍 Line: {issue.get('line')}")
-                    print(f"      📝 {issue.get('description', 'No description')}")
+                        report(f"      📍 Line: {issue.get('line')}")
+                    report(f"      📝 {issue.get('description', 'No description')}")
                     if issue.get('suggestion'):
-                        print(f"      💡 Suggestion: {issue.get('suggestion')}")
-                    print()
+                        report(f"      💡 Suggestion: {issue.get('suggestion')}")
+                    report()
                     
         except Exception as parse_error:
-            print(f"   ⚠️ Could not parse as JSON: {parse_error}")
+            report(f"   ⚠️ Could not parse as JSON: {parse_error}")
             
         return claude_response
         
     except Exception as e:
-        print(f"   ❌ Bedrock Error: {e}")
-        print(f"   📋 Error Type: {type(e).__name__}")
+        report(f"   ❌ Bedrock Error: {e}")
+        report(f"   📋 Error Type: {type(e).__name__}")
         return None
 
-def check_lambda_logs(session_id: str):
-    """Check Lambda function logs"""
-    print(f"\n📋 Checking Lambda logs for session: {session_id}")
+def wait_for_lambda(session_id: str, start_time: float) -> bool:
+    """Wait until the Lambda logs mention the session instead of sleeping a fixed time"""
+    report(f"\n⏳ Waiting up to {LAMBDA_WAIT_TIMEOUT} seconds for Lambda to process...")
     
-    try:
-        # Get recent logs from Lambda
-        logs_client = boto3.client('logs', region_name=REGION)
+    deadline = time.monotonic() + LAMBDA_WAIT_TIMEOUT
+    interval = LAMBDA_POLL_INTERVAL
+    while True:
+        try:
+            events_response = get_client('logs').filter_log_events(
+                logGroupName=LAMBDA_LOG_GROUP,
+                filterPattern=f'"{session_id}"',
+                startTime=int(start_time * 1000),
+                limit=1
+            )
+        except Exception as e:
+            report(f"   ⚠️ Could not poll Lambda logs: {e}")
+            return False
+        
+        if events_response['events']:
+            report(f"   ✅ Lambda picked up the session")
+            return True
         
-        # List log streams for the Lambda function
-        log_group = '/aws/lambda/codereview-ai-processor'
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            report(f"   ⚠️ No Lambda log events for the session after {LAMBDA_WAIT_TIMEOUT} seconds")
+            return False
         
-        streams_response = logs_client.describe_log_streams(
-            logGroupName=log_group,
-            orderBy='LastEventTime',
-            descending=True,
-            limit=5
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, LAMBDA_POLL_MAX_INTERVAL)
+
+def check_lambda_logs(session_id: str, start_time: float):
+    """Check Lambda function logs"""
+    report(f"\n📋 Checking Lambda logs for session: {session_id}")
+    
+    try:
+        # Let CloudWatch match the session across every log stream in one request
+        events_response = get_client('logs').filter_log_events(
+            logGroupName=LAMBDA_LOG_GROUP,
+            filterPattern=f'"{session_id}"',
+            startTime=int(start_time * 1000),
+            limit=100
         )
         
-        print(f"   📊 Found {len(streams_response['logStreams'])} recent log streams")
+        report(f"   📊 Found {len(events_response['events'])} log events for the session")
         
-        for stream in streams_response['logStreams'][:2]:  # Check last 2 streams
-            stream_name = stream['logStreamName']
-            print(f"   🔍 Checking stream: {stream_name}")
-            
-            events_response = logs_client.get_log_events(
-                logGroupName=log_group,
-                logStreamName=stream_name,
-                limit=50
-            )
-            
-            for event in events_response['events']:
-                message = event['message']
-                if session_id in message or 'session' in message.lower():
-                    timestamp = datetime.fromtimestamp(event['timestamp'] / 1000)
-                    print(f"      🕐 {timestamp}: {message}")
+        for event in events_response['events']:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(event['timestamp'] / 1000))
+            report(f"      🕐 {timestamp} UTC: {event['message']}")
                     
     except Exception as e:
-        print(f"   ⚠️ Could not check Lambda logs: {e}")
+        report(f"   ⚠️ Could not check Lambda logs: {e}")
+
+def parse_args(argv=None):
+    """Parse which of the tests to run"""
+    parser = argparse.ArgumentParser(description="Test the CodeReview AI S3 → Lambda → ECS → Bedrock pipeline")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--bedrock-only', dest='mode', action='store_const', const='bedrock',
+                      help="only run test 1, the direct Bedrock analysis")
+    mode.add_argument('--pipeline-only', dest='mode', action='store_const', const='pipeline',
+                      help="only run test 2, the S3 → Lambda pipeline, without calling Bedrock")
+    mode.add_argument('--both', dest='mode', action='store_const', const='both',
+                      help="run both tests, overlapping the uploads with the analysis (default)")
+    parser.set_defaults(mode='both')
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
     """Main test function"""
-    print("🚀 CodeReview AI Pipeline Test - CloudShell Edition")
-    print("="*60)
+    args = parse_args(argv)
+    output_listener.start()
+    try:
+        run_tests(args.mode)
+    finally:
+        # Drains the queued output before returning
+        output_listener.stop()
+
+def run_tests(mode: str = 'both'):
+    """Run the Bedrock and S3 pipeline tests, mode is 'bedrock', 'pipeline' or 'both'"""
+    run_bedrock = mode != 'pipeline'
+    run_pipeline = mode != 'bedrock'
+    
+    report("🚀 CodeReview AI Pipeline Test - CloudShell Edition")
+    report("="*60)
     
     # Generate session ID
     session_id = str(uuid.uuid4())
-    print(f"🆔 Test Session ID: {session_id}")
+    report(f"🆔 Test Session ID: {session_id}")
     
     # Create test files
-    print(f"\n📁 Creating test files...")
+    report(f"\n📁 Creating test files...")
     files = create_test_files()
     for filename in files.keys():
-        print(f"   📄 {filename} ({len(files[filename])} chars)")
-    
-    # Test 1: Direct Bedrock Analysis
-    print(f"\n" + "="*60)
-    print("TEST 1: Direct Bedrock Analysis (Fastest)")
-    print("="*60)
+        report(f"   📄 {filename} ({len(files[filename])} chars)")
     
-    bedrock_response = test_bedrock_directly(files)
+    # Upload files to S3 in the background while Bedrock analyzes them, so the
+    # uploads and the Lambda they trigger overlap the analysis. The upload report
+    # is held back until test 2 to keep it out of the streamed response.
+    bedrock_response = None
+    uploaded_keys = []
+    upload_log = []
+    upload_started = time.time()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        uploads = executor.submit(upload_test_files_to_s3, session_id, files, upload_log) if run_pipeline else None
+        
+        # Test 1: Direct Bedrock Analysis
+        if run_bedrock:
+            report(f"\n" + "="*60)
+            report("TEST 1: Direct Bedrock Analysis (Fastest)")
+            report("="*60)
+            
+            bedrock_response = test_bedrock_directly(files)
+        
+        if uploads:
+            uploaded_keys = uploads.result()
     
-    # Test 2: Full S3 Pipeline (if Bedrock worked)
-    if bedrock_response:
-        print(f"\n" + "="*60)
-        print("TEST 2: Full S3 → Lambda Pipeline")
-        print("="*60)
+    # Test 2: Full S3 Pipeline (if Bedrock worked, or on its own)
+    if run_pipeline and (bedrock_response or not run_bedrock):
+        report(f"\n" + "="*60)
+        report("TEST 2: Full S3 → Lambda Pipeline")
+        report("="*60)
         
-        # Upload files to S3
-        uploaded_keys = upload_test_files_to_s3(session_id, files)
+        report('\n'.join(upload_log))
         
         if uploaded_keys:
-            print(f"\n⏳ Waiting 10 seconds for Lambda to process...")
-            time.sleep(10)
+            wait_for_lambda(session_id, upload_started)
             
             # Check Lambda logs
-            check_lambda_logs(session_id)
-            
-            print(f"\n🧹 Cleaning up test files...")
-            for key in uploaded_keys:
-                try:
-                    s3_client.delete_object(Bucket=BUCKET_NAME, Key=key)
-                    print(f"   🗑️ Deleted: {key}")
-                except Exception as e:
-                    print(f"   ⚠️ Could not delete {key}: {e}")
+            check_lambda_logs(session_id, upload_started)
+    
+    if uploaded_keys:
+        report(f"\n🧹 Cleaning up test files...")
+        delete_test_files_from_s3(uploaded_keys)
     
-    print(f"\n✅ Test completed!")
-    print(f"🔧 If you saw Bedrock responses above, your pipeline is working!")
+    report(f"\n✅ Test completed!")
+    report(f"🔧 If you saw Bedrock responses above, your pipeline is working!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,25 @@
+"""
+Parsing of Bedrock replies into analysis results
+"""
+
+import pytest
+
+from server.python_services.aws_service import aws_service, extract_json_object, is_analysis_root
+
+
+@pytest.mark.parametrize("reply", [
+    '{"passedChecks": 3, "issues": []}',
+    'Here is the review:\n```json\n{"passedChecks": 3, "issues": []}\n```',
+    'The first issue {"type": "error"} is nested, the analysis is {"passedChecks": 3, "issues": []}',
+])
+def test_the_analysis_object_is_found(reply):
+    assert aws_service._parse_analysis_result(reply) == {'passedChecks': 3, 'issues': []}
+
+
+def test_a_nested_issue_is_not_taken_for_the_analysis():
+    assert extract_json_object('Issues: {"type": "error", "line": 3}', is_analysis_root) is None
+
+
+def test_the_search_is_bounded_on_replies_without_a_root():
+    assert extract_json_object('{' * 100_000, is_analysis_root) is None
+    assert aws_service._parse_analysis_result('[1, 2]')['issues'][0]['title'] == "Analysis Parsing Error"
@@ -0,0 +1,29 @@
+"""
+File processor tests for the handling of model output
+"""
+
+import pytest
+
+from server.python_services.file_processor import file_processor
+
+
+@pytest.mark.parametrize("raw", [["not", "an", "object"], "text", None, 3])
+def test_non_dict_results_become_the_fallback(raw):
+    result = file_processor._normalize_result(raw)
+    assert result['issues'][0]['title'] == "Analysis Parsing Error"
+    assert all(isinstance(result[name], int) for name in ('passedChecks', 'warnings', 'errors'))
+
+
+def test_counters_are_coerced_to_integers():
+    result = file_processor._normalize_result({
+        'passedChecks': 7.0, 'warnings': '2', 'errors': None, 'issues': [{'type': 'error'}, 'stray']
+    })
+    assert (result['passedChecks'], result['warnings'], result['errors']) == (7, 2, 0)
+    assert result['issues'] == [{'type': 'error'}]
+
+
+def test_distributed_passed_checks_stay_integers():
+    analysis = file_processor._normalize_result({'passedChecks': 9.0, 'issues': 'none'})
+    per_file = file_processor._distribute_issues_across_files(analysis, ['a.py', 'b.py'])
+    assert per_file['a.py']['passedChecks'] == 4
+    assert isinstance(per_file['a.py']['passedChecks'], int)
@@ -0,0 +1,137 @@
+"""
+Storage tests, the Redis implementation runs against fakeredis
+"""
+
+import asyncio
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from server.python_storage import (
+    MemStorage, RedisStorage, AnalysisSessionCreate, FileAnalysisCreate
+)
+
+
+def make_storages():
+    return [MemStorage(), RedisStorage(fakeredis.FakeAsyncRedis())]
+
+
+async def create_session_with_files(storage, count):
+    session = await storage.create_analysis_session(AnalysisSessionCreate(status='pending', totalFiles=count))
+    files = []
+    for index in range(count):
+        files.append(await storage.create_file_analysis(FileAnalysisCreate(
+            sessionId=session.id,
+            fileName=f"f{index}.py",
+            fileSize=10,
+            fileType='text/plain',
+            s3Key=f"sessions/{session.id}/f{index}.py",
+            status='uploading'
+        )))
+    return session, files
+
+
+@pytest.mark.parametrize("storage", make_storages(), ids=["memory", "redis"])
+def test_concurrent_updates_of_one_file_move_the_counters_once(storage):
+    async def run():
+        session, (file, other) = await create_session_with_files(storage, 2)
+        
+        # A duplicated webhook updates the same file twice at once
+        await asyncio.gather(*(
+            storage.update_file_analysis(file.id, {'status': 'processing'}) for _ in range(4)
+        ))
+        
+        session = await storage.get_analysis_session(session.id)
+        counts = {status: count for status, count in session.fileStatusCounts.items() if count}
+        assert counts == {'uploading': 1, 'processing': 1}
+        assert session.totalSize == 20
+    
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("storage", make_storages(), ids=["memory", "redis"])
+def test_concurrent_bulk_and_single_updates_keep_the_aggregates(storage):
+    async def run():
+        session, files = await create_session_with_files(storage, 3)
+        result = {'passedChecks': 2, 'warnings': 1, 'errors': 0, 'issues': []}
+        
+        await asyncio.gather(
+            storage.bulk_update_file_analyses({
+                file.id: {'status': 'completed', 'analysisResult': result} for file in files
+            }),
+            *(storage.update_file_analysis(file.id, {'status': 'processing'}) for file in files)
+        )
+        
+        session = await storage.get_analysis_session(session.id)
+        stored = [await storage.get_file_analysis(file.id) for file in files]
+        expected_counts = {}
+        for file in stored:
+            expected_counts[file.status] = expected_counts.get(file.status, 0) + 1
+        counts = {status: count for status, count in session.fileStatusCounts.items() if count}
+        assert counts == expected_counts
+        assert session.passedChecks == sum(2 for file in stored if file.analysisResult)
+        assert session.warnings == sum(1 for file in stored if file.analysisResult)
+    
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("storage", make_storages(), ids=["memory", "redis"])
+def test_concurrent_transitions_have_one_winner(storage):
+    async def run():
+        session, (file,) = await create_session_with_files(storage, 1)
+        
+        # Duplicated webhooks race to move the file and then the session
+        moved = await asyncio.gather(*(
+            storage.transition_file_analysis(file.id, 'uploading', {'status': 'processing'}) for _ in range(4)
+        ))
+        started = await asyncio.gather(*(
+            storage.transition_analysis_session(session.id, 'pending', {'status': 'processing'}) for _ in range(4)
+        ))
+        
+        assert sum(1 for result in moved if result) == 1
+        assert sum(1 for result in started if result) == 1
+        session = await storage.get_analysis_session(session.id)
+        assert session.status == 'processing'
+        assert {status: count for status, count in session.fileStatusCounts.items() if count} == {'processing': 1}
+        assert await storage.transition_analysis_session(session.id, 'pending', {'status': 'processing'}) is None
+    
+    asyncio.run(run())
+
+
+def test_file_writes_do_not_recreate_an_expired_session():
+    async def run():
+        client = fakeredis.FakeAsyncRedis()
+        storage = RedisStorage(client)
+        session, (file,) = await create_session_with_files(storage, 1)
+        assert await client.ttl(f"session:{session.id}") > 0
+        
+        # The session hash expires while its file is still being written
+        await client.delete(f"session:{session.id}")
+        await storage.update_file_analysis(file.id, {
+            'status': 'completed',
+            'analysisResult': {'passedChecks': 1, 'warnings': 0, 'errors': 0, 'issues': []}
+        })
+        await storage.create_file_analysis(FileAnalysisCreate(
+            sessionId=session.id, fileName='late.py', fileSize=1, fileType='text/plain', s3Key='late.py'
+        ))
+        
+        assert not await client.exists(f"session:{session.id}")
+        assert await storage.get_analysis_session(session.id) is None
+        assert (await storage.get_file_analysis(file.id)).status == 'completed'
+    
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("storage", make_storages(), ids=["memory", "redis"])
+def test_empty_strings_read_back_unchanged(storage):
+    async def run():
+        session = await storage.create_analysis_session(AnalysisSessionCreate())
+        file = await storage.create_file_analysis(FileAnalysisCreate(
+            sessionId=session.id, fileName='Makefile', fileSize=1, fileType='', s3Key='Makefile'
+        ))
+        
+        stored = await storage.get_file_analysis(file.id)
+        assert stored.fileType == ''
+        assert stored.completedAt is None and stored.analysisResult is None
+    
+    asyncio.run(run())